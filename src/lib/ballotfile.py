@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+# A compact binary file of already validated and aggregated ballots, which is counted without parsing anything, e.g.
+#   python -m lib.ballotfile import RP -c A,B,C,D ballots.txt ballots.vbal
+#   python -m lib.ballotfile export ballots.vbal ballots.txt
+#   python -m lib.cli RP -c A,B,C,D ballots.vbal
+#
+# The file starts with the magic bytes VOCHOBAL and the length of a JSON header (a little-endian uint32). The header
+# holds the format version, the candidates, the method the ballots were entered for, the amount of distinct ballots,
+# the type of the ranks and any other metadata. It's padded with spaces so that the arrays after it are aligned:
+#   counts: a little-endian uint32 per distinct ballot, how many voters cast it
+#   ranks: a row per distinct ballot with the rank (lower is better) of each candidate in the order of the header,
+#     uint8 or little-endian uint16 with the greatest value for candidates not mentioned. Equally preferred
+#     candidates (RP only) share their rank and blank ballots don't mention anyone
+# Both arrays are read straight from the memory mapped file, as NumPy arrays if available
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+
+from lib.exceptions import InvalidBallotException
+from lib.ballots import CandidateRegistry, parse_candidates, normalize_ballots, aggregate_ballots
+from lib.pairwise import pairwise_matrix
+from lib.validation import ballot_problem, check_ballots, parse_ranking, parse_rows
+from lib.util import optional_numpy
+
+magic = b'VOCHOBAL'
+file_version = 1
+
+# The struct format and greatest value of each rank type
+rank_types = {
+	'u1': ('B', 0xff),
+	'u2': ('H', 0xffff)
+}
+
+# Writes the ballots, in the text format of the GUI, to a ballot file. The ballots are validated for the method first
+def write_ballot_file (path, method, candidates, ballots, metadata = {}):
+	ballots = list(ballots)
+	check_ballots(method, candidates, ballots)
+	registry = CandidateRegistry(candidates)
+	num_candidates = len(registry)
+	rank_type = 'u1' if num_candidates < rank_types['u1'][1] else 'u2'
+	rank_format, unranked = rank_types[rank_type]
+
+	ballot_groups = aggregate_ballots(normalize_ballots(ballots))
+	counts = []
+	ranks = []
+	for ballot, count in ballot_groups:
+		row = [ unranked ] * num_candidates
+		if method != 'STV':
+			for y, cands in enumerate(parse_rows(registry, ballot)[0]):
+				for cand in cands:
+					row[cand] = y
+		else:
+			for y, cand in enumerate(parse_ranking(registry, ballot)[0]):
+				row[cand] = y
+		counts.append(count)
+		ranks.extend(row)
+
+	header = {
+		'version': file_version,
+		'method': method,
+		'candidates': registry.names,
+		'ballots': len(counts),
+		'rank_type': rank_type,
+		'metadata': metadata
+	}
+	header_bytes = json.dumps(header, ensure_ascii = False).encode('utf8')
+	header_bytes += b' ' * (-(len(magic) + 4 + len(header_bytes)) % 8)
+
+	with open(path, 'wb') as f:
+		f.write(magic)
+		f.write(struct.pack('<I', len(header_bytes)))
+		f.write(header_bytes)
+		f.write(struct.pack('<%dI' % (len(counts)), *counts))
+		f.write(struct.pack('<%d%s' % (len(ranks), rank_format), *ranks))
+
+def is_ballot_file (path):
+	try:
+		with open(path, 'rb') as f:
+			return f.read(len(magic)) == magic
+	except OSError:
+		return False
+
+# A ballot file mapped into memory. It has the same interface as a LiveTally, so it can be counted with
+# STVFromTally or RankedPairsFromTally, but the ballots of the file are never parsed: STV gets its sequences of
+# candidate ids by sorting the ranks, RP gets its pairwise matrix from the ranks as they are
+class BallotFile:
+	def __init__ (self, path):
+		with open(path, 'rb') as f:
+			self.buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		if self.buffer[:len(magic)] != magic:
+			self.buffer.close()
+			raise ValueError('%s is not a ballot file' % (path))
+		header_length = struct.unpack_from('<I', self.buffer, len(magic))[0]
+		offset = len(magic) + 4
+		self.header = json.loads(self.buffer[offset:offset + header_length].decode('utf8'))
+		offset += header_length
+		if self.header['version'] != file_version:
+			self.buffer.close()
+			raise ValueError('Unsupported ballot file version %s' % (self.header['version']))
+
+		self.method = self.header['method']
+		self.candidates = self.header['candidates']
+		self.metadata = self.header['metadata']
+		self.num_groups = self.header['ballots']
+		num_candidates = len(self.candidates)
+		rank_format, self.unranked = rank_types[self.header['rank_type']]
+
+		np = optional_numpy()
+		if np is not None:
+			self.counts = np.frombuffer(self.buffer, dtype = '<u4', count = self.num_groups, offset = offset)
+			rank_dtype = '<u%d' % (struct.calcsize(rank_format))
+			self.ranks = np.frombuffer(self.buffer, dtype = rank_dtype, count = self.num_groups * num_candidates,
+				offset = offset + 4 * self.num_groups).reshape(self.num_groups, num_candidates)
+			self.num_ballots = int(self.counts.sum())
+			self.blank_ballots = int(self.counts[(self.ranks == self.unranked).all(axis = 1)].sum())
+		else:
+			# The arrays are little-endian, only a big-endian machine needs a copy
+			counts = memoryview(self.buffer)[offset:offset + 4 * self.num_groups]
+			ranks = memoryview(self.buffer)[offset + 4 * self.num_groups:]
+			if sys.byteorder == 'little':
+				self.counts = counts.cast('I')
+				self.ranks = ranks.cast(rank_format)
+			else:
+				self.counts = struct.unpack('<%dI' % (self.num_groups), counts)
+				self.ranks = struct.unpack('<%d%s' % (self.num_groups * num_candidates, rank_format), ranks)
+			self.num_ballots = sum(self.counts)
+			self.blank_ballots = 0
+			for i, count in enumerate(self.counts):
+				if all(map(lambda rank: rank == self.unranked, self.rank_row(i))):
+					self.blank_ballots += count
+
+		self._matrix = None
+		self._mentions = None
+
+	def rank_row (self, i):
+		num_candidates = len(self.candidates)
+		return self.ranks[i * num_candidates:(i + 1) * num_candidates]
+
+	def close (self):
+		# The arrays point into the mapped file, which can't be closed while they exist
+		self.counts = None
+		self.ranks = None
+		self.buffer.close()
+
+	def __enter__ (self):
+		return self
+
+	def __exit__ (self, *args):
+		self.close()
+
+	# The ballots as (candidate ids, count) groups like STV makes them, the ids being the indices of the candidates.
+	# Equal preferences make a ballot invalid
+	def ballot_groups (self):
+		groups = []
+		np = optional_numpy()
+		if np is not None:
+			order = np.argsort(self.ranks, axis = 1, kind = 'stable')
+			sorted_ranks = np.take_along_axis(self.ranks, order, axis = 1)
+			lengths = (self.ranks != self.unranked).sum(axis = 1)
+			equal = ((sorted_ranks[:, 1:] == sorted_ranks[:, :-1]) & (sorted_ranks[:, 1:] != self.unranked)).any(axis = 1)
+			if equal.any():
+				self.raise_equal_preferences(np.flatnonzero(equal).tolist())
+			order = order.tolist()
+			for i, (length, count) in enumerate(zip(lengths.tolist(), self.counts.tolist())):
+				groups.append((tuple(order[i][:length]), count))
+			return groups
+
+		equal = []
+		for i, count in enumerate(self.counts):
+			ranked = sorted(filter(lambda x: x[0] != self.unranked, map(lambda x: (x[1], x[0]), enumerate(self.rank_row(i)))))
+			if len(set(map(lambda x: x[0], ranked))) != len(ranked):
+				equal.append(i)
+			groups.append((tuple(map(lambda x: x[1], ranked)), count))
+		if len(equal):
+			self.raise_equal_preferences(equal)
+		return groups
+
+	def raise_equal_preferences (self, groups):
+		problems = list(map(lambda i: ballot_problem('equal_preferences', self.ballot_text(i)), groups))
+		raise InvalidBallotException('%d invalid ballots' % (len(problems)), problems)
+
+	# RP counts candidates in the order of their names
+	def rp_order (self):
+		return sorted(range(len(self.candidates)), key = lambda cand: self.candidates[cand])
+
+	@property
+	def matrix (self):
+		if self._matrix is None:
+			order = self.rp_order()
+			np = optional_numpy()
+			if np is not None:
+				mentioned = (self.ranks != self.unranked).any(axis = 1)
+				self._matrix = pairwise_matrix(self.ranks[mentioned][:, order], self.counts[mentioned], len(order))
+			else:
+				rank_vectors = []
+				counts = []
+				for i, count in enumerate(self.counts):
+					row = self.rank_row(i)
+					if any(map(lambda rank: rank != self.unranked, row)):
+						rank_vectors.append(list(map(lambda cand: row[cand], order)))
+						counts.append(count)
+				self._matrix = pairwise_matrix(rank_vectors, counts, len(order))
+		return self._matrix
+
+	@property
+	def mentions (self):
+		if self._mentions is None:
+			order = self.rp_order()
+			np = optional_numpy()
+			if np is not None:
+				mentions = self.counts.astype(np.int64) @ (self.ranks != self.unranked)
+				self._mentions = mentions[order].tolist()
+			else:
+				mentions = [ 0 ] * len(order)
+				for i, count in enumerate(self.counts):
+					for cand, rank in enumerate(self.rank_row(i)):
+						if rank != self.unranked:
+							mentions[cand] += count
+				self._mentions = list(map(lambda cand: mentions[cand], order))
+		return self._mentions
+
+	# A distinct ballot in the text format, e.g. A>B=C>D, or blanka if it's blank
+	def ballot_text (self, i):
+		np = optional_numpy()
+		if np is not None:
+			row = self.ranks[i].tolist()
+		else:
+			row = self.rank_row(i)
+		ranked = sorted(filter(lambda x: x[0] != self.unranked, map(lambda x: (x[1], x[0]), enumerate(row))))
+		if not len(ranked):
+			return 'blanka'
+		text = self.candidates[ranked[0][1]]
+		for (prev_rank, prev_cand), (rank, cand) in zip(ranked, ranked[1:]):
+			text += ('=' if rank == prev_rank else '>') + self.candidates[cand]
+		return text
+
+	# The ballots in the text format, one line per voter, grouped by distinct ballot
+	def text_lines (self):
+		for i in range(self.num_groups):
+			text = self.ballot_text(i)
+			for j in range(int(self.counts[i])):
+				yield text
+
+def main (argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m lib.ballotfile', description = 'Convert ballots between the text format and ballot files')
+	commands = parser.add_subparsers(dest = 'command', required = True)
+	import_parser = commands.add_parser('import', help = 'write a ballot file from ballots in the text format')
+	import_parser.add_argument('method', type = str.upper, choices = ('RP', 'STV'))
+	import_parser.add_argument('ballots', help = 'file to read the ballots from, - for stdin')
+	import_parser.add_argument('output', help = 'the ballot file to write')
+	import_parser.add_argument('-c', '--candidates', required = True, help = 'the candidates separated by commas')
+	import_parser.add_argument('--title', help = 'stored in the metadata of the file')
+	export_parser = commands.add_parser('export', help = 'write the ballots of a ballot file in the text format')
+	export_parser.add_argument('ballot_file')
+	export_parser.add_argument('output', nargs = '?', default = '-', help = 'file to write the ballots to, - (default) for stdout')
+	args = parser.parse_args(argv)
+
+	if args.command == 'import':
+		metadata = {}
+		if args.title is not None:
+			metadata['title'] = args.title
+		ballots_file = sys.stdin if args.ballots == '-' else open(args.ballots, encoding = 'utf8')
+		try:
+			write_ballot_file(args.output, args.method, parse_candidates(args.candidates), ballots_file, metadata)
+		except InvalidBallotException as e:
+			print(e, file = sys.stderr)
+			for problem in e.problems:
+				print('line %d: %s' % (problem['line'], problem['message']), file = sys.stderr)
+			return 1
+		finally:
+			if ballots_file is not sys.stdin:
+				ballots_file.close()
+		return 0
+
+	with BallotFile(args.ballot_file) as ballot_file:
+		output_file = sys.stdout if args.output == '-' else open(args.output, 'w', encoding = 'utf8')
+		try:
+			for line in ballot_file.text_lines():
+				print(line, file = output_file)
+		finally:
+			if output_file is not sys.stdout:
+				output_file.close()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,51 @@
+import re
+from collections import Counter
+
+space_regex = r'\s'
+
+# Candidate names are separated by commas and may be longer than a single character
+def parse_candidates (text):
+	names = map(lambda name: re.sub(space_regex, '', name), text.split(','))
+	return list(filter(lambda name: len(name), names))
+
+# Maps the candidate names to dense integer ids (their index in the list), which is what the engines count with
+class CandidateRegistry:
+	def __init__ (self, names):
+		self.names = list(dict.fromkeys(names))
+		self.ids = dict(map(lambda x: (x[1], x[0]), enumerate(self.names)))
+		# Without longer names a ranking may be written without separators, e.g. ABC
+		self.single_character = all(map(lambda name: len(name) == 1, self.names))
+
+	def __len__ (self):
+		return len(self.names)
+
+	def __contains__ (self, name):
+		return name in self.ids
+
+	# Splits a ranking without equal preferences, such as an STV ballot, into its candidate names:
+	# A>B>C, or ABC if every candidate name is a single character
+	def split_ranking (self, ballot):
+		if self.single_character and not '>' in ballot:
+			return list(ballot)
+		return list(filter(lambda name: len(name), ballot.split('>')))
+
+# Turns a raw line into a ballot as understood by the engines: whitespace is removed and 'blanka' becomes a blank
+# ballot. Empty lines aren't ballots at all and give None
+def normalize_ballot (line):
+	ballot = re.sub(space_regex, '', line)
+	if not len(ballot):
+		return None
+	return '' if ballot == 'blanka' else ballot
+
+def normalize_ballots (lines):
+	for line in lines:
+		ballot = normalize_ballot(line)
+		if ballot is not None:
+			yield ballot
+
+# Collapses identical ballots into (ballot, count) groups in the order they first appear,
+# so that the engines only have to count each distinct ordering once
+# Any iterable of ballots works, so ballots can be streamed in without ever holding them all in memory
+# A mapping of ballots to their counts, such as a Counter, is taken as already aggregated
+def aggregate_ballots (ballots):
+	return list(Counter(ballots).items())
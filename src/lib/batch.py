@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# Counts many elections listed in a manifest in parallel, e.g.
+#   python -m lib.batch kongreso.json -o rezultoj.json
+#
+# The manifest is JSON (or TOML with Python 3.11+) with a list of elections:
+#   { "elections": [
+#     { "name": "Estraro", "method": "STV", "candidates": "A,B,C,D", "places": 2, "ballots": "estraro.txt" },
+#     { "name": "Propono 1", "method": "RP", "candidates": "A,B,C", "ignored": "C", "ballots": "propono1.txt",
+#       "tie_breaker": "A>B>C", "profile": true }
+#   ] }
+# Ballot files are relative to the manifest and hold one ballot per line as in the GUI
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from lib.election import election_methods, count_election, jsonable
+from lib.ballots import parse_candidates
+from lib.validation import check_aggregate_ballots
+from lib.exceptions import InvalidBallotException, TooManyBlankBallotsException
+
+def load_manifest (path):
+	with open(path, 'rb') as f:
+		if path.endswith('.toml'):
+			import tomllib
+			manifest = tomllib.load(f)
+		else:
+			manifest = json.load(f)
+
+	base_path = os.path.dirname(os.path.abspath(path))
+	elections = []
+	for i, election in enumerate(manifest['elections']):
+		election = dict(election)
+		election.setdefault('name', '%d' % (i + 1))
+		election['method'] = election['method'].upper()
+		if not election['method'] in election_methods:
+			raise ValueError('Unknown election method %s in election %s' % (election['method'], election['name']))
+		for key in ('candidates', 'ignored'):
+			value = election.get(key, '')
+			if not isinstance(value, str):
+				value = ','.join(value)
+			election[key] = parse_candidates(value)
+		election['ballots'] = os.path.join(base_path, election['ballots'])
+		elections.append(election)
+
+	return elections
+
+# Counts a single election of the manifest, turning any failure into an error entry of the report, so that one bad
+# election doesn't lose the reports of all the others
+def run_manifest_election (election):
+	report = {
+		'name': election['name'],
+		'method': election['method']
+	}
+	start_time = time.perf_counter()
+
+	try:
+		with open(election['ballots'], encoding = 'utf8') as f:
+			ballots = check_aggregate_ballots(election['method'], election['candidates'], f)
+			report['results'] = count_election(
+				election['method'],
+				election['candidates'],
+				ballots,
+				election['ignored'],
+				election.get('places', 1),
+				election.get('tie_breaker'),
+				election.get('profile', False)
+			)
+	except Exception as e:
+		report['error'] = {
+			'type': type(e).__name__,
+			'message': str(e)
+		}
+		if isinstance(e, TooManyBlankBallotsException):
+			report['error']['blank_ballots'] = e.blank_ballots
+			report['error']['num_ballots'] = e.num_ballots
+		if isinstance(e, InvalidBallotException) and len(e.problems):
+			report['error']['problems'] = e.problems
+
+	report['time'] = time.perf_counter() - start_time
+	return report
+
+def run_manifest (elections, jobs = None):
+	start_time = time.perf_counter()
+	with ProcessPoolExecutor(max_workers = jobs) as executor:
+		reports = list(executor.map(run_manifest_election, elections))
+
+	return {
+		'elections': reports,
+		'failed': len(list(filter(lambda r: 'error' in r, reports))),
+		'time': time.perf_counter() - start_time
+	}
+
+def main (argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m lib.batch', description = 'Count all elections of a manifest in parallel')
+	parser.add_argument('manifest', help = 'JSON or TOML file listing the elections')
+	parser.add_argument('-j', '--jobs', type = int, help = 'amount of worker processes (default: one per core)')
+	parser.add_argument('-o', '--output', help = 'file to write the JSON report to (default: stdout)')
+	args = parser.parse_args(argv)
+
+	report = run_manifest(load_manifest(args.manifest), args.jobs)
+
+	if args.output:
+		with open(args.output, 'w', encoding = 'utf8') as f:
+			json.dump(jsonable(report), f, ensure_ascii = False, indent = '\t')
+	else:
+		json.dump(jsonable(report), sys.stdout, ensure_ascii = False, indent = '\t')
+		print()
+
+	return 1 if report['failed'] else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Times the counting methods on reproducible synthetic elections, e.g.
+#   python -m lib.bench -o bench.json
+#   python -m lib.bench -n 1000 100000 -c 5 30 -m impartial ties --methods RP
+#   python -m lib.bench --methods STV --decimals 4 6
+# Every combination of ballot count, candidate count and electorate model is counted and the time spent in each
+# phase of the count is written as JSON, along with the commit, so runs can be compared across commits
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from lib import util
+from lib.election import election_methods, count_election
+from lib.synthetic import electorate_models, rp_only_models, generate_election
+from lib.exceptions import NoEligibleCandidatesException, TooManyBlankBallotsException, TieBreakerNeededException
+
+default_ballot_counts = [ 1000, 10000, 100000, 1000000 ]
+default_candidate_counts = [ 3, 10, 30, 60 ]
+
+# The trace events that end each phase of the count
+phase_events = {
+	'STV': [ ('prepare', 'start'), ('count', 'done') ],
+	'RP': [ ('tally', 'place'), ('count', 'done') ],
+	'SCHULZE': [ ('tally', 'place'), ('count', 'done') ],
+	'COPELAND': [ ('tally', 'place'), ('count', 'done') ],
+	'MINIMAX': [ ('tally', 'place'), ('count', 'done') ]
+}
+
+# A trace sink noting when the first event of each kind happened
+class PhaseTimer:
+	def __init__ (self):
+		self.times = {}
+
+	def __call__ (self, event):
+		if not event['event'] in self.times:
+			self.times[event['event']] = time.perf_counter()
+
+def time_count (method, candidates, ballots, places, decimals = None):
+	timer = PhaseTimer()
+	util.add_trace_sink(timer)
+	start_time = time.perf_counter()
+	try:
+		results = count_election(method, candidates, ballots, places = places, tie_breaker = '>'.join(candidates), decimals = decimals)
+	finally:
+		util.remove_trace_sink(timer)
+	end_time = time.perf_counter()
+
+	phases = {}
+	last_time = start_time
+	for phase, event in phase_events[method]:
+		phases[phase] = timer.times[event] - last_time
+		last_time = timer.times[event]
+	phases['results'] = end_time - last_time
+	phases['total'] = end_time - start_time
+	return phases, results
+
+# With decimals set STV counts in fixed point, see STV
+def run_benchmark (method, model, num_ballots, num_candidates, places = 3, seed = 0, repeat = 1, decimals = None):
+	entry = {
+		'method': method,
+		'model': model,
+		'ballots': num_ballots,
+		'candidates': num_candidates,
+		'places': min(places, num_candidates) if method == 'STV' else 1
+	}
+	if decimals is not None:
+		entry['decimals'] = decimals
+
+	start_time = time.perf_counter()
+	candidates, ballots = generate_election(model, num_ballots, num_candidates, seed)
+	entry['generate'] = time.perf_counter() - start_time
+
+	# The fastest of the repeats is the least disturbed by everything else going on
+	try:
+		for i in range(repeat):
+			phases, results = time_count(method, candidates, ballots, entry['places'], decimals)
+			if i == 0:
+				entry['phases'] = phases
+			else:
+				entry['phases'] = dict(map(lambda x: (x[0], min(x[1], phases[x[0]])), entry['phases'].items()))
+		entry['winners'] = results['winners']
+	except (TooManyBlankBallotsException, TieBreakerNeededException, NoEligibleCandidatesException) as e:
+		entry['error'] = type(e).__name__
+
+	return entry
+
+def main (argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m lib.bench', description = 'Time the counting methods on synthetic elections')
+	parser.add_argument('-n', '--ballots', type = int, nargs = '+', default = default_ballot_counts, help = 'ballot counts to try')
+	parser.add_argument('-c', '--candidates', type = int, nargs = '+', default = default_candidate_counts, help = 'candidate counts to try')
+	parser.add_argument('-m', '--models', nargs = '+', choices = list(electorate_models), default = list(electorate_models))
+	parser.add_argument('--methods', type = str.upper, nargs = '+', choices = election_methods, default = list(election_methods))
+	parser.add_argument('-p', '--places', type = int, default = 3, help = 'places to fill in STV elections (default: 3)')
+	parser.add_argument('-s', '--seed', type = int, default = 0)
+	parser.add_argument('-r', '--repeat', type = int, default = 1, help = 'count every election this many times and keep the fastest')
+	parser.add_argument('-d', '--decimals', type = int, nargs = '+', default = [], help = 'also count STV in fixed point with these amounts of decimals')
+	parser.add_argument('-o', '--output', help = 'file to write the JSON results to (default: stdout)')
+	args = parser.parse_args(argv)
+
+	np = util.optional_numpy()
+	report = {
+		'commit': util.git_commit(),
+		'python': platform.python_version(),
+		'numpy': np.__version__ if np is not None else None,
+		'platform': platform.platform(),
+		'seed': args.seed,
+		'results': []
+	}
+
+	for num_candidates in args.candidates:
+		for num_ballots in args.ballots:
+			for model in args.models:
+				for method in args.methods:
+					if method == 'STV' and model in rp_only_models:
+						continue
+					for decimals in [ None ] + (args.decimals if method == 'STV' else []):
+						entry = run_benchmark(method, model, num_ballots, num_candidates, args.places, args.seed, args.repeat, decimals)
+						report['results'].append(entry)
+						print('%s%s %s: %d ballots, %d candidates: %s' % (
+							method, '' if decimals is None else ' (%d decimals)' % (decimals), model, num_ballots, num_candidates,
+							entry['error'] if 'error' in entry else '%.3f s' % (entry['phases']['total'])
+						), file = sys.stderr)
+
+	if args.output:
+		with open(args.output, 'w', encoding = 'utf8') as f:
+			json.dump(report, f, ensure_ascii = False, indent = '\t')
+	else:
+		json.dump(report, sys.stdout, ensure_ascii = False, indent = '\t')
+		print()
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
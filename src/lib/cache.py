@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from lib.election import count_election, count_tally, resume_election
+from lib.ballots import aggregate_ballots
+from lib.exceptions import TieBreakerNeededException
+
+# Remembers the results of counts so that counting the same election again, e.g. after changing the ignored
+# candidates back, returns at once. Results are keyed by a hash of everything they depend on: the method, the
+# candidates, the ignored candidates, the places, the distinct ballots in the order they first appear along with
+# their counts (which is all the engines see of the ballots) and the tie breaker.
+# The most recently used results are kept in memory, and with a path also on disk, where they outlive the program.
+# A count that needed a tie breaker is remembered in memory until it's resumed, so asking again doesn't count
+# anything either, and once resumed asking again without a tie breaker gives the results it was resumed to.
+# The results returned hold under 'cache' where they came from: 'memory', 'disk' or None
+# The version of the results on disk, to be raised whenever the results change their shape
+cache_version = 1
+
+# The results are written to disk as JSON, which unlike pickle can't run any code when it's read. JSON has no
+# tuples, sets or keys other than strings, all of which the results have, so every dict, tuple and set is written
+# as an object with its kind as the only key, e.g. { "tuple": [ "A", "B" ] }, and read back as it was
+def encode_results (obj):
+	if isinstance(obj, dict):
+		return { 'dict': list(map(lambda x: [ encode_results(x[0]), encode_results(x[1]) ], obj.items())) }
+	if isinstance(obj, tuple):
+		return { 'tuple': list(map(encode_results, obj)) }
+	if isinstance(obj, set):
+		return { 'set': list(map(encode_results, obj)) }
+	if isinstance(obj, list):
+		return list(map(encode_results, obj))
+	return obj
+
+def decode_results (obj):
+	if isinstance(obj, dict):
+		kind, value = next(iter(obj.items()))
+		if kind == 'dict':
+			return dict(map(lambda x: (decode_results(x[0]), decode_results(x[1])), value))
+		if kind == 'tuple':
+			return tuple(map(decode_results, value))
+		if kind == 'set':
+			return set(map(decode_results, value))
+		raise ValueError('Unknown kind %s in cached results' % (kind))
+	if isinstance(obj, list):
+		return list(map(decode_results, obj))
+	return obj
+
+class ResultCache:
+	def __init__ (self, max_entries = 32, path = None):
+		self.max_entries = max_entries
+		self.path = path
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+		if path is not None:
+			os.makedirs(path, exist_ok = True)
+
+	def count (self, method, candidates, ballots, ignored_candidates = [], places = 1, tie_breaker = None, profile = False):
+		ballot_groups = aggregate_ballots(ballots)
+		election_key = self.election_key(method, candidates, ballot_groups, ignored_candidates, places)
+		count = lambda: count_election(method, candidates, dict(ballot_groups), ignored_candidates, places, tie_breaker, profile)
+		return self.cached(election_key, tie_breaker, profile, count)
+
+	# Counts a LiveTally, or anything else with the same interface that lists its lines
+	def count_tally (self, method, tally, ignored_candidates = [], places = 1, tie_breaker = None, profile = False):
+		ballot_groups = list(map(lambda ballot: (ballot, tally.counts[ballot]), filter(lambda ballot: ballot is not None, dict.fromkeys(tally.lines))))
+		election_key = self.election_key(method, tally.candidates, ballot_groups, ignored_candidates, places)
+		count = lambda: count_tally(method, tally, ignored_candidates, places, tie_breaker, profile)
+		return self.cached(election_key, tie_breaker, profile, count)
+
+	# Resumes a count that needed a tie breaker, see resume_election
+	def resume (self, checkpoint, tie_breaker, profile = False):
+		count = lambda: resume_election(checkpoint, tie_breaker, profile)
+		if not 'cache_key' in checkpoint:
+			# The count didn't go through the cache, so there's nothing to key the results by
+			results = count()
+			results['cache'] = None
+			return results
+		results = self.cached(checkpoint['cache_key'], tie_breaker, profile, count)
+		# Counting the same election again without a tie breaker would only stop at the same tie
+		if not profile:
+			tie_broken = dict(filter(lambda x: x[0] != 'cache', results.items()))
+			self.put(self.result_key(checkpoint['cache_key'], None), copy.deepcopy(tie_broken), True)
+		return results
+
+	def election_key (self, method, candidates, ballot_groups, ignored_candidates, places):
+		key = hashlib.sha256()
+		key.update(json.dumps([ method, list(candidates), sorted(ignored_candidates), places ], ensure_ascii = False).encode('utf8'))
+		for ballot, count in ballot_groups:
+			key.update(('\n%s\t%d' % (ballot, count)).encode('utf8'))
+		return key.hexdigest()
+
+	def result_key (self, election_key, tie_breaker):
+		return hashlib.sha256(('%s\n%s' % (election_key, tie_breaker)).encode('utf8')).hexdigest()
+
+	# Profiled counts are neither looked up nor kept, as their point is to be measured
+	def cached (self, election_key, tie_breaker, profile, count):
+		if profile:
+			results = count()
+			results['cache'] = None
+			return results
+
+		key = self.result_key(election_key, tie_breaker)
+		entry = self.get(key)
+		if entry is not None:
+			results, tier = entry
+			if isinstance(results, TieBreakerNeededException):
+				if not results.checkpoint['resumed']:
+					raise TieBreakerNeededException(results.checkpoint)
+			else:
+				results = copy.deepcopy(results)
+				results['cache'] = tier
+				return results
+
+		try:
+			results = count()
+		except TieBreakerNeededException as e:
+			if e.checkpoint is not None:
+				e.checkpoint['cache_key'] = election_key
+				self.put(key, e, False)
+			raise
+		self.put(key, copy.deepcopy(results), True)
+		results['cache'] = None
+		return results
+
+	def get (self, key):
+		with self.lock:
+			if key in self.entries:
+				self.entries.move_to_end(key)
+				return self.entries[key], 'memory'
+
+		if self.path is None:
+			return None
+		try:
+			with open(os.path.join(self.path, key + '.json'), encoding = 'utf8') as f:
+				entry = json.load(f)
+			if entry['version'] != cache_version or entry['key'] != key:
+				return None
+			results = decode_results(entry['results'])
+		except (OSError, ValueError, KeyError, TypeError, StopIteration):
+			return None
+		self.remember(key, results)
+		return results, 'disk'
+
+	def put (self, key, results, to_disk):
+		self.remember(key, results)
+		if self.path is None or not to_disk:
+			return
+		# Written to a temporary file first so that no other process ever reads a partial file
+		path = os.path.join(self.path, key + '.json')
+		entry = {
+			'version': cache_version,
+			'key': key,
+			'results': encode_results(results)
+		}
+		try:
+			with open(path + '.%d.tmp' % (os.getpid()), 'w', encoding = 'utf8') as f:
+				json.dump(entry, f, ensure_ascii = False)
+			os.replace(path + '.%d.tmp' % (os.getpid()), path)
+		except OSError:
+			pass
+
+	def remember (self, key, results):
+		with self.lock:
+			self.entries[key] = results
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.max_entries:
+				self.entries.popitem(last = False)
+
+	def clear (self):
+		with self.lock:
+			self.entries.clear()
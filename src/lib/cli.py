@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Counts an election without the GUI, e.g.
+#   python -m lib.cli STV -c A,B,C,D -p 2 ballots.txt
+#   python -m lib.cli RP -c A,B,C < ballots.txt
+#   python -m lib.cli RP ballots.vbal
+# The ballots are read line by line in the same format as in the GUI, or counted straight from a ballot file
+# (see lib.ballotfile), and the results are printed as JSON. They can also be exported, e.g.
+#   python -m lib.cli STV -c A,B,C,D -p 2 ballots.txt --export results.html
+
+import argparse
+import json
+import logging
+import sys
+
+from lib import util
+from lib.election import election_methods, count_election, count_tally, jsonable
+from lib.ballots import parse_candidates
+from lib.validation import check_aggregate_ballots
+from lib.ballotfile import BallotFile, is_ballot_file
+from lib.export import export_formats, export_results
+from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, NoEligibleCandidatesException, TooManyBlankBallotsException, TieBreakerNeededException
+
+def main (argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m lib.cli', description = 'Count an election from a file of ballots, one per line')
+	parser.add_argument('method', type = str.upper, choices = election_methods)
+	parser.add_argument('ballots', nargs = '?', default = '-', help = 'file to read the ballots from, - (default) for stdin')
+	parser.add_argument('-c', '--candidates', help = 'the candidates separated by commas, a ballot file has its own')
+	parser.add_argument('-i', '--ignored', default = '', help = 'the ignored candidates separated by commas')
+	parser.add_argument('-p', '--places', type = int, default = 1)
+	parser.add_argument('-t', '--tie-breaker', help = 'the tie breaker ballot, e.g. A>B>D>C for RP or ABDC for STV')
+	parser.add_argument('-d', '--decimals', type = int, help = 'count STV votes in fixed point with this many decimals instead of floats')
+	parser.add_argument('-v', '--verbose', action = 'store_true', help = 'print the full count to stderr')
+	parser.add_argument('--trace', metavar = 'FILE', help = 'write the events of the count to FILE as JSON lines')
+	parser.add_argument('--profile', action = 'store_true', help = 'add the time and memory spent on each phase of the count to the results')
+	parser.add_argument('--export', metavar = 'FILE', help = 'also write the results to FILE as %s, by its extension' % (', '.join(export_formats)))
+	args = parser.parse_intermixed_args(argv)
+
+	# The debug output goes to stderr so it doesn't end up among the JSON
+	if args.verbose:
+		logging.basicConfig(stream = sys.stderr, level = logging.DEBUG, format = '%(message)s')
+
+	trace_file = None
+	if args.trace:
+		trace_file = open(args.trace, 'w', encoding = 'utf8')
+		util.add_trace_sink(util.JSONLinesSink(trace_file))
+
+	ignored_candidates = parse_candidates(args.ignored)
+	if args.export is not None and not args.export.rsplit('.', 1)[-1].lower() in export_formats:
+		parser.error('the export file must end in .%s' % (', .'.join(export_formats)))
+
+	if args.ballots != '-' and is_ballot_file(args.ballots):
+		ballots_file = BallotFile(args.ballots)
+		candidates = ballots_file.candidates
+		if args.candidates is not None and set(parse_candidates(args.candidates)) != set(ballots_file.candidates):
+			ballots_file.close()
+			parser.error('the candidates of the ballot file are %s' % (', '.join(ballots_file.candidates)))
+	else:
+		if args.candidates is None:
+			parser.error('the candidates are required unless the ballots are a ballot file')
+		candidates = parse_candidates(args.candidates)
+		ballots_file = sys.stdin if args.ballots == '-' else open(args.ballots, encoding = 'utf8')
+	try:
+		if isinstance(ballots_file, BallotFile):
+			results = count_tally(args.method, ballots_file, ignored_candidates, args.places, args.tie_breaker, args.profile, args.decimals)
+		else:
+			ballots = check_aggregate_ballots(args.method, candidates, ballots_file)
+			results = count_election(args.method, candidates, ballots, ignored_candidates, args.places, args.tie_breaker, args.profile, args.decimals)
+	except TieBreakerNeededException:
+		print('A tie breaker is needed, pass it with --tie-breaker', file = sys.stderr)
+		return 3
+	except TooManyBlankBallotsException as e:
+		print('Too many blank ballots (%d of %d)' % (e.blank_ballots, e.num_ballots), file = sys.stderr)
+		return 2
+	except (InvalidTieBreakerException, InvalidBallotException, NoEligibleCandidatesException, ValueError) as e:
+		print(e, file = sys.stderr)
+		for problem in getattr(e, 'problems', []):
+			if 'line' in problem:
+				print('line %d: %s' % (problem['line'], problem['message']), file = sys.stderr)
+			else:
+				print(problem['message'], file = sys.stderr)
+		return 1
+	finally:
+		if ballots_file is not sys.stdin:
+			ballots_file.close()
+		if trace_file is not None:
+			trace_file.close()
+
+	if args.export is not None:
+		export_results(args.export, args.method, results, candidates, ignored_candidates)
+
+	json.dump(jsonable(results), sys.stdout, ensure_ascii = False, indent = '\t')
+	print()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,206 @@
+from lib.exceptions import TieBreakerNeededException
+from lib.util import debug, optional_numpy, trace, tracing
+from lib.pairwise import count_pairwise, resume_pairwise
+from lib.profiling import run_profiled
+
+# Condorcet methods besides Ranked Pairs, so that RP can be compared with them on the same votes. They count from the
+# same PairwiseMatrix as RP, apply §2.6 the same way and fill several places the same way (see count_pairwise),
+# so counting the same ballots with another of them only costs the count itself:
+#   SCHULZE: the winner beats or ties every other candidate along the strongest paths of pairwise wins, the
+#     strength of a path being the least amount of voters preferring one candidate over the next along it
+#   COPELAND: the winner won the most pairs, with a tied pair counting half for both
+#   MINIMAX: the winner's worst pairwise defeat is the smallest, measured as a margin
+# When several candidates are equally good the tie breaker ballot's most preferred of them wins
+condorcet_methods = ('SCHULZE', 'COPELAND', 'MINIMAX')
+
+# With fewer candidates than this the strongest paths are found in plain Python, see strongest_paths
+numpy_min_candidates = 10
+
+# The candidates that may win, those disqualified per §2.6 and the compared pairs, as in RP but with tied pairs
+# left without a winner. The pairs and stats are already keyed by name, as they are in the results
+def compare_candidates (pairwise, ignored_ids):
+	names = pairwise.names
+	traced = tracing() # Only build the trace events if anyone is listening
+
+	remaining_candidates = pairwise.eligible(ignored_ids)
+	disqualified_candidates = []
+	for cand in range(len(names)):
+		if cand in ignored_ids:
+			debug('%s is ignored in this election', names[cand])
+			if traced:
+				trace('ignored', candidate = names[cand])
+		elif not cand in remaining_candidates:
+			disqualified_candidates.append(cand)
+			debug('%s is disqualified due to insufficient mentions', names[cand])
+			if traced:
+				trace('disqualified', candidate = names[cand], mentions = pairwise.mentions[cand])
+
+	cand_stats = {}
+	for cand in range(len(names)):
+		cand_stats[names[cand]] = {
+			'won': 0,
+			'lost': 0,
+			'tied': 0,
+			'mentions': pairwise.mentions[cand]
+		}
+
+	pairs = {}
+	for i, cand1 in enumerate(remaining_candidates):
+		for cand2 in remaining_candidates[i + 1:]:
+			name1 = names[cand1]
+			name2 = names[cand2]
+			pair = {
+				'diff': pairwise.matrix[cand1][cand2] - pairwise.matrix[cand2][cand1],
+				'winner': None,
+				'loser': None,
+				'votes': {
+					name1: pairwise.matrix[cand1][cand2],
+					name2: pairwise.matrix[cand2][cand1]
+				}
+			}
+			if pair['diff'] > 0:
+				pair['winner'] = name1
+				pair['loser'] = name2
+			elif pair['diff'] < 0:
+				pair['winner'] = name2
+				pair['loser'] = name1
+			if pair['winner'] is None:
+				cand_stats[name1]['tied'] += 1
+				cand_stats[name2]['tied'] += 1
+			else:
+				cand_stats[pair['winner']]['won'] += 1
+				cand_stats[pair['loser']]['lost'] += 1
+			pairs[(name1, name2)] = pair
+
+	return remaining_candidates, disqualified_candidates, pairs, cand_stats
+
+# Picks the winner among the equally good candidates
+def best_candidate (names, best_cands, tie_breaker_list):
+	if len(best_cands) <= 1:
+		return best_cands[0]
+	if not len(tie_breaker_list):
+		raise TieBreakerNeededException()
+	winner = min(best_cands, key = lambda cand: tie_breaker_list.index(cand))
+	debug('Tie between %s broken by the tie breaker', ', '.join(map(lambda cand: names[cand], best_cands)))
+	return winner
+
+def place_results (pairwise, winner, disqualified_candidates, pairs, cand_stats, scores):
+	names = pairwise.names
+	named_scores = dict(map(lambda x: (names[x[0]], x[1]), scores.items()))
+
+	debug('\nCompared pairs:\n%s', pairs)
+	debug('\nScores:\n%s', named_scores)
+	debug('\nWinner: %s', names[winner])
+	trace('winner', candidate = names[winner])
+
+	return {
+		'ballots': pairwise.num_ballots,
+		'blank_ballots': pairwise.blank_ballots,
+		'winner': names[winner],
+		'disqualified_candidates': list(map(lambda cand: names[cand], disqualified_candidates)),
+		'comp_pairs': pairs,
+		'cand_stats': cand_stats,
+		'scores': named_scores
+	}
+
+# The strength of the strongest path from each of the candidates to each other, paths[i][j] being that from the
+# i-th to the j-th of cands. A pair only counts as a link from its winner, as strong as the amount of voters
+# preferring the winner. The widest paths are found by Floyd–Warshall, with a whole matrix per step with NumPy
+def strongest_paths (pairwise, cands):
+	matrix = pairwise.matrix
+	num_cands = len(cands)
+	np = optional_numpy() if num_cands >= numpy_min_candidates else None
+	if np is not None:
+		wins = np.array(matrix, dtype = np.int64)[np.ix_(cands, cands)]
+		paths = np.where(wins > wins.T, wins, 0)
+		for k in range(num_cands):
+			paths = np.maximum(paths, np.minimum(paths[:, k, None], paths[None, k, :]))
+		# Going round in a circle only ever adds to the diagonal, which isn't a path at all
+		np.fill_diagonal(paths, 0)
+		return paths.tolist()
+
+	paths = list(map(lambda a: list(map(lambda b: matrix[a][b] if matrix[a][b] > matrix[b][a] else 0, cands)), cands))
+	for k in range(num_cands):
+		row_k = paths[k]
+		for i in range(num_cands):
+			path_ik = paths[i][k]
+			if i == k or not path_ik:
+				continue
+			row_i = paths[i]
+			for j in range(num_cands):
+				if j != i and j != k:
+					path = min(path_ik, row_k[j])
+					if path > row_i[j]:
+						row_i[j] = path
+	return paths
+
+def count_schulze_place (pairwise, ignored_ids, tie_breaker_list, profiler):
+	profiler.enter('pairs')
+	remaining_candidates, disqualified_candidates, pairs, cand_stats = compare_candidates(pairwise, ignored_ids)
+
+	profiler.enter('paths')
+	paths = strongest_paths(pairwise, remaining_candidates)
+	num_cands = len(remaining_candidates)
+	scores = {}
+	best_cands = []
+	for i, cand in enumerate(remaining_candidates):
+		# The score is how many others the candidate beats along the strongest paths
+		scores[cand] = len(list(filter(lambda j: paths[i][j] > paths[j][i], range(num_cands))))
+		if all(map(lambda j: paths[i][j] >= paths[j][i], range(num_cands))):
+			best_cands.append(cand)
+
+	profiler.enter('results')
+	winner = best_candidate(pairwise.names, best_cands, tie_breaker_list)
+	results = place_results(pairwise, winner, disqualified_candidates, pairs, cand_stats, scores)
+	names = pairwise.names
+	results['strongest_paths'] = {}
+	for i, cand1 in enumerate(remaining_candidates):
+		results['strongest_paths'][names[cand1]] = dict(map(lambda x: (names[x[1]], paths[i][x[0]]), filter(lambda x: x[0] != i, enumerate(remaining_candidates))))
+	return results
+
+def count_copeland_place (pairwise, ignored_ids, tie_breaker_list, profiler):
+	profiler.enter('pairs')
+	remaining_candidates, disqualified_candidates, pairs, cand_stats = compare_candidates(pairwise, ignored_ids)
+
+	profiler.enter('results')
+	names = pairwise.names
+	scores = dict(map(lambda cand: (cand, cand_stats[names[cand]]['won'] + cand_stats[names[cand]]['tied'] / 2), remaining_candidates))
+	best_score = max(scores.values())
+	best_cands = list(filter(lambda cand: scores[cand] == best_score, remaining_candidates))
+	winner = best_candidate(names, best_cands, tie_breaker_list)
+	return place_results(pairwise, winner, disqualified_candidates, pairs, cand_stats, scores)
+
+def count_minimax_place (pairwise, ignored_ids, tie_breaker_list, profiler):
+	profiler.enter('pairs')
+	remaining_candidates, disqualified_candidates, pairs, cand_stats = compare_candidates(pairwise, ignored_ids)
+
+	profiler.enter('results')
+	matrix = pairwise.matrix
+	# The score is the margin of the worst defeat, negative for a candidate who beats everyone else
+	scores = {}
+	for cand in remaining_candidates:
+		others = filter(lambda other: other != cand, remaining_candidates)
+		scores[cand] = max(map(lambda other: matrix[other][cand] - matrix[cand][other], others), default = 0)
+	best_score = min(scores.values())
+	best_cands = list(filter(lambda cand: scores[cand] == best_score, remaining_candidates))
+	winner = best_candidate(pairwise.names, best_cands, tie_breaker_list)
+	return place_results(pairwise, winner, disqualified_candidates, pairs, cand_stats, scores)
+
+condorcet_places = {
+	'SCHULZE': count_schulze_place,
+	'COPELAND': count_copeland_place,
+	'MINIMAX': count_minimax_place
+}
+
+# Counts the ballots, written as for RP, with one of condorcet_methods. With profile set the results also hold the
+# time and memory spent on each phase of the count
+def Condorcet (method, candidates, ballots, ignored_candidates = [], tie_breaker = None, places = 1, profile = False):
+	return run_profiled(profile, count_pairwise, method, condorcet_places[method], candidates, ballots, ignored_candidates, tie_breaker, places, None)
+
+# Counts from the pairwise matrix of a LiveTally, which is the same whichever Condorcet method is counted
+def CondorcetFromTally (method, tally, ignored_candidates = [], tie_breaker = None, places = 1, profile = False):
+	return run_profiled(profile, count_pairwise, method, condorcet_places[method], tally.candidates, None, ignored_candidates, tie_breaker, places, tally)
+
+# Goes on with a count that needed a tie breaker, from the checkpoint of its TieBreakerNeededException
+def CondorcetResume (checkpoint, tie_breaker, profile = False):
+	return run_profiled(profile, resume_pairwise, checkpoint, condorcet_places[checkpoint['method']], tie_breaker)
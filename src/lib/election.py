@@ -0,0 +1,44 @@
+from lib.ranked_pairs import RankedPairs, RankedPairsFromTally, RankedPairsResume
+from lib.stv import STV, STVFromTally, STVResume
+from lib.condorcet import condorcet_methods, Condorcet, CondorcetFromTally, CondorcetResume
+
+election_methods = ('RP', 'STV') + condorcet_methods
+
+# Counts an election with any method using the same arguments, decimals only matters to STV (see STV)
+def count_election (method, candidates, ballots, ignored_candidates = [], places = 1, tie_breaker = None, profile = False, decimals = None):
+	if method == 'RP':
+		return RankedPairs(candidates, ballots, ignored_candidates, tie_breaker, places, profile = profile)
+	elif method == 'STV':
+		return STV(places, candidates, ballots, ignored_candidates, tie_breaker, profile = profile, decimals = decimals)
+	elif method in condorcet_methods:
+		return Condorcet(method, candidates, ballots, ignored_candidates, tie_breaker, places, profile = profile)
+	raise ValueError('Unknown election method %s' % (method))
+
+# Counts an already tallied election, such as a LiveTally or a BallotFile, with any method
+def count_tally (method, tally, ignored_candidates = [], places = 1, tie_breaker = None, profile = False, decimals = None):
+	if method == 'RP':
+		return RankedPairsFromTally(tally, ignored_candidates, tie_breaker, places, profile = profile)
+	elif method == 'STV':
+		return STVFromTally(places, tally, ignored_candidates, tie_breaker, profile = profile, decimals = decimals)
+	elif method in condorcet_methods:
+		return CondorcetFromTally(method, tally, ignored_candidates, tie_breaker, places, profile = profile)
+	raise ValueError('Unknown election method %s' % (method))
+
+# Goes on with a count of any method from the checkpoint of its TieBreakerNeededException
+def resume_election (checkpoint, tie_breaker, profile = False):
+	if checkpoint['method'] == 'RP':
+		return RankedPairsResume(checkpoint, tie_breaker, profile = profile)
+	elif checkpoint['method'] in condorcet_methods:
+		return CondorcetResume(checkpoint, tie_breaker, profile = profile)
+	return STVResume(checkpoint, tie_breaker, profile = profile)
+
+# Turns results into something the json module can write: sets become sorted lists and pairs, which are
+# keyed by a tuple of both candidates, are keyed by the candidates joined with a comma
+def jsonable (obj):
+	if isinstance(obj, dict):
+		return dict(map(lambda x: (','.join(x[0]) if isinstance(x[0], tuple) else x[0], jsonable(x[1])), obj.items()))
+	if isinstance(obj, (list, tuple)):
+		return list(map(jsonable, obj))
+	if isinstance(obj, set):
+		return sorted(obj)
+	return obj
@@ -2,7 +2,17 @@ class InvalidTieBreakerException (Exception):
 	pass
 
 class InvalidBallotException (Exception):
-	pass
+	def __init__ (self, message, problems = []):
+		super().__init__(message)
+
+		self.problems = problems
+
+# Still a ValueError, as which it was raised before it had its own class
+class InvalidIgnoredCandidateException (ValueError):
+	def __init__ (self, candidate):
+		super().__init__('Ignored candidate %s is not a candidate' % (candidate))
+
+		self.candidate = candidate
 
 class TooManyBlankBallotsException (Exception):
 	def __init__ (self, message, blank_ballots, num_ballots):
@@ -11,5 +21,16 @@ class TooManyBlankBallotsException (Exception):
 		self.blank_ballots = blank_ballots
 		self.num_ballots = num_ballots
 
+# Everyone is either ignored or disqualified per §2.6, so no one can win
+class NoEligibleCandidatesException (Exception):
+	pass
+
+# The checkpoint, if any, is where the count stopped, see STVResume and RankedPairsResume
 class TieBreakerNeededException (Exception):
+	def __init__ (self, checkpoint = None):
+		super().__init__('A tie breaker is needed')
+
+		self.checkpoint = checkpoint
+
+class CountCancelledException (Exception):
 	pass
@@ -0,0 +1,178 @@
+import csv
+import html
+import json
+import os
+
+from lib.election import jsonable
+
+# The results of a count laid out as tables, as they are shown in the GUI and exported. A table doesn't hold its
+# rows: row(i) builds the cells of a row from the results when it's asked for, so that a view only ever builds the
+# rows it shows and an export only one row at a time. cell_style(i, j) tells how a cell stands out, if it does:
+# 'elected' or 'eliminated'
+class ResultTable:
+	def __init__ (self, title, columns, num_rows, row, cell_style = None):
+		self.title = title
+		self.columns = columns
+		self.num_rows = num_rows
+		self.row = row
+		self.cell_style = cell_style if cell_style is not None else lambda i, j: None
+
+	def rows (self):
+		for i in range(self.num_rows):
+			yield self.row(i)
+
+# How a cell is written out, votes with three decimals as in the rest of Voĉo
+def cell_text (value):
+	if value is None:
+		return ''
+	if isinstance(value, float):
+		return '%.3f' % (value)
+	return str(value)
+
+def summary_table (method, results, ignored_candidates):
+	rows = [
+		('Balotiloj', results['ballots']),
+		('Blankaj balotiloj', results['blank_ballots'])
+	]
+	if len(ignored_candidates):
+		rows.append(('Ignorataj kandidatoj', ', '.join(ignored_candidates)))
+	if method == 'STV':
+		rows.append(('Elektiĝkvoto', results['quota']))
+	elif len(results['disqualified_candidates']):
+		disc_cands = map(lambda c: '%s (%d mencioj)' % (c, results['cand_stats'][c]['mentions']), results['disqualified_candidates'])
+		rows.append(('Neelektitaj laŭ §2.6', ', '.join(disc_cands)))
+	rows.append(('Venkintoj (laŭ ordo de elektiĝo)', ', '.join(results['winners'])))
+	return ResultTable('Resumo', [ 'Ero', 'Valoro' ], len(rows), lambda i: list(rows[i]))
+
+def pairs_table (title, ranked_pairs):
+	def row (i):
+		pair_name, pair = ranked_pairs[i]
+		cand1, cand2 = pair_name
+		return [ cand1, pair['votes'][cand1], cand2, pair['votes'][cand2], pair['winner'], abs(pair['diff']) ]
+	return ResultTable(title, [ 'Kandidato', 'Voĉoj', 'Kandidato', 'Voĉoj', 'Gajnanto', 'Diferenco' ], len(ranked_pairs), row)
+
+def graph_table (title, graph):
+	edges = list(graph.items())
+	return ResultTable(title, [ 'De', 'Al' ], len(edges), lambda i: [ edges[i][0], ', '.join(edges[i][1]) ])
+
+# What the score of each Condorcet method (see lib.condorcet) is, and whether a higher score is better
+score_names = {
+	'SCHULZE': ('Venkoj laŭ la plej fortaj vojoj', True),
+	'COPELAND': ('Poentoj', True),
+	'MINIMAX': ('Plej granda malvenko', False)
+}
+
+# The candidates who could win a place from the best to the worst score, along with their pairwise record
+def scores_table (title, method, step):
+	score_name, higher_better = score_names[method]
+	scores = step['scores']
+	cands = sorted(scores, key = lambda cand: -scores[cand] if higher_better else scores[cand])
+	def row (i):
+		stats = step['cand_stats'][cands[i]]
+		return [ cands[i], scores[cands[i]], stats['won'], stats['lost'], stats['tied'] ]
+	return ResultTable(title, [ 'Kandidato', score_name, 'Venkoj', 'Malvenkoj', 'Egalaĵoj' ], len(cands), row)
+
+# The strength of the strongest path from the candidate of each row to that of each column
+def paths_table (title, paths):
+	cands = list(paths)
+	row = lambda i: [ cands[i] ] + list(map(lambda cand: paths[cands[i]].get(cand), cands))
+	return ResultTable(title, [ 'De \\ Al' ] + cands, len(cands), row)
+
+# A row per candidate with their votes in each round, up to the round where they dropped out
+def rounds_table (rounds, candidates):
+	def row (i):
+		cand = candidates[i]
+		cells = [ cand ] + [ None ] * len(rounds)
+		for j, stv_round in enumerate(rounds):
+			if not cand in stv_round['votes']:
+				break
+			cells[j + 1] = float(stv_round['votes'][cand])
+		return cells
+
+	def cell_style (i, j):
+		if j == 0:
+			return None
+		cand = candidates[i]
+		stv_round = rounds[j - 1]
+		if cand in stv_round['elected']:
+			return 'elected'
+		elif cand == stv_round['eliminated']:
+			return 'eliminated'
+		return None
+
+	columns = [ 'Voĉdoneblo' ] + list(map(lambda i: '%d-a vico' % (i + 1), range(len(rounds))))
+	return ResultTable('Vicoj', columns, len(candidates), row, cell_style)
+
+def result_tables (method, results, candidates, ignored_candidates = []):
+	tables = [ summary_table(method, results, ignored_candidates) ]
+	if method == 'STV':
+		tables.append(rounds_table(results['rounds'], candidates))
+		return tables
+
+	for i, step in enumerate(results['steps']):
+		prefix = '%d-a venkinto: ' % (i + 1) if len(results['steps']) > 1 else ''
+		if method == 'RP':
+			tables.append(pairs_table(prefix + 'Komparitaj paroj', step['ranked_pairs']))
+			tables.append(graph_table(prefix + 'Grafeo', step['graph']))
+			continue
+		tables.append(scores_table(prefix + 'Poentoj', method, step))
+		if 'strongest_paths' in step:
+			tables.append(paths_table(prefix + 'Plej fortaj vojoj', step['strongest_paths']))
+		tables.append(pairs_table(prefix + 'Komparitaj paroj', list(step['comp_pairs'].items())))
+	return tables
+
+# The writers go through the tables row by row, so that nothing but the current row is ever built in memory
+
+# The tables one after the other, each headed by its title and followed by an empty line
+def write_csv (f, tables):
+	writer = csv.writer(f)
+	for table in tables:
+		writer.writerow([ table.title ])
+		writer.writerow(table.columns)
+		for row in table.rows():
+			writer.writerow(list(map(cell_text, row)))
+		writer.writerow([])
+
+def write_html (f, tables):
+	f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Rezulto</title></head><body>\n')
+	for table in tables:
+		f.write('<h2>%s</h2>\n<table border="1">\n<tr>' % (html.escape(table.title)))
+		for column in table.columns:
+			f.write('<th>%s</th>' % (html.escape(column)))
+		f.write('</tr>\n')
+		for i, row in enumerate(table.rows()):
+			f.write('<tr>')
+			for j, value in enumerate(row):
+				text = html.escape(cell_text(value))
+				style = table.cell_style(i, j)
+				if style == 'elected':
+					text = '<b>%s</b>' % (text)
+				elif style == 'eliminated':
+					text = '<s>%s</s>' % (text)
+				f.write('<td>%s</td>' % (text))
+			f.write('</tr>\n')
+		f.write('</table>\n')
+	f.write('</body></html>\n')
+
+# The results as the CLI prints them. json.dump writes them out piece by piece as it encodes them
+def write_json (f, results):
+	results = dict(filter(lambda x: x[0] != 'cache', results.items()))
+	json.dump(jsonable(results), f, ensure_ascii = False, indent = '\t')
+	f.write('\n')
+
+export_formats = ('csv', 'json', 'html')
+
+# Writes the results to a file in the given format, by default the one of its extension
+def export_results (path, method, results, candidates, ignored_candidates = [], format = None):
+	if format is None:
+		format = os.path.splitext(path)[1][1:].lower()
+	if not format in export_formats:
+		raise ValueError('Unknown export format %s' % (format))
+
+	with open(path, 'w', encoding = 'utf8', newline = '' if format == 'csv' else None) as f:
+		if format == 'json':
+			write_json(f, results)
+		elif format == 'csv':
+			write_csv(f, result_tables(method, results, candidates, ignored_candidates))
+		else:
+			write_html(f, result_tables(method, results, candidates, ignored_candidates))
@@ -0,0 +1,225 @@
+from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, InvalidIgnoredCandidateException, NoEligibleCandidatesException, TooManyBlankBallotsException, TieBreakerNeededException
+from lib.util import debug, optional_numpy, trace, tracing
+from lib.ballots import aggregate_ballots, CandidateRegistry
+from lib.validation import parse_rows
+
+# Fewer distinct ballots than this are compared in plain Python, which is quicker than importing NumPy for them
+numpy_min_ballots = 100
+
+# Builds the matrix where matrix[i][j] is the amount of voters preferring candidate i over candidate j
+# rank_vectors holds a rank (lower is better) per candidate for each distinct ballot, counts holds how many
+# voters cast that ballot. The tallying events along the way are what lets a count be cancelled meanwhile
+def pairwise_matrix (rank_vectors, counts, num_candidates):
+	if not len(rank_vectors):
+		return [ [ 0 ] * num_candidates for i in range(num_candidates) ]
+	traced = tracing()
+
+	np = optional_numpy() if len(rank_vectors) >= numpy_min_ballots else None
+	if np is not None:
+		ranks = np.array(rank_vectors, dtype=np.int32)
+		weights = np.array(counts, dtype=np.int64)
+		matrix = np.empty((num_candidates, num_candidates), dtype=np.int64)
+		# One batched comparison of a candidate's column against all other columns per candidate
+		for i in range(num_candidates):
+			if traced:
+				trace('tallying', done = i, total = num_candidates)
+			matrix[i] = weights @ (ranks[:, i, None] < ranks)
+		return matrix.tolist()
+
+	# A ballot file passes its ranks and counts as NumPy arrays of unsigned ints, which would overflow once
+	# subtracted from each other, so they're counted as Python ints
+	if hasattr(rank_vectors, 'tolist'):
+		rank_vectors = rank_vectors.tolist()
+	if hasattr(counts, 'tolist'):
+		counts = counts.tolist()
+
+	matrix = [ [ 0 ] * num_candidates for i in range(num_candidates) ]
+	for n, (ranks, count) in enumerate(zip(rank_vectors, counts)):
+		if traced and not n % 1000:
+			trace('tallying', done = n, total = len(rank_vectors))
+		for i, rank_i in enumerate(ranks):
+			row = matrix[i]
+			for j, rank_j in enumerate(ranks):
+				if rank_i < rank_j:
+					row[j] += count
+	return matrix
+
+# Turns a ballot into a rank vector, with candidates not mentioned ranked below those mentioned, along with the ids
+# of the candidates mentioned. Blank ballots give None
+def rp_ballot_ranks (registry, ballot):
+	rows, problems = parse_rows(registry, ballot)
+	if len(problems):
+		raise InvalidBallotException(problems[0]['message'], problems)
+	if not len(rows):
+		return None
+
+	ranks = [ len(rows) ] * len(registry)
+	mentioned = []
+	for y, row in enumerate(rows):
+		for cand in row:
+			mentioned.append(cand)
+			ranks[cand] = y
+	return ranks, mentioned
+
+# Validates the tie breaker and turns it into the candidate ids from the most to the least preferred
+def rp_tie_breaker (registry, tie_breaker):
+	tie_breaker_list = tie_breaker.split('>')
+
+	if len(set(tie_breaker_list)) != len(tie_breaker_list):
+		raise InvalidTieBreakerException('The tie breaker ballot must not contain duplicate candidates')
+
+	if len(tie_breaker_list) < len(registry):
+		raise InvalidTieBreakerException('The tie breaker ballot must contain all candidates')
+
+	for cand in tie_breaker_list:
+		if not cand in registry:
+			raise InvalidTieBreakerException('Invalid candidate %s in tie breaker' % (cand))
+
+	return list(map(lambda cand: registry.ids[cand], tie_breaker_list))
+
+# The pairwise tally of an election, which is all that Ranked Pairs and the other Condorcet methods (see
+# lib.condorcet) count from, so it's only built once however many of them are counted. The candidates are counted
+# by their id, their index in the registry of their names in sorted order: matrix[i][j] is the amount of voters
+# preferring candidate i over candidate j and mentions[i] the amount of ballots mentioning candidate i
+class PairwiseMatrix:
+	def __init__ (self, registry, matrix, mentions, num_ballots, blank_ballots):
+		self.registry = registry
+		self.names = registry.names
+		self.matrix = matrix
+		self.mentions = mentions
+		self.num_ballots = num_ballots
+		self.blank_ballots = blank_ballots
+
+	def __len__ (self):
+		return len(self.names)
+
+	# The candidates that may win: those not ignored that are mentioned on at least half of the ballots (§2.6)
+	def eligible (self, ignored_ids):
+		return list(filter(lambda cand: not cand in ignored_ids and self.mentions[cand] >= self.num_ballots / 2, range(len(self.names))))
+
+def pairwise_registry (candidates):
+	return CandidateRegistry(sorted(candidates))
+
+# Validates and tallies the ballots, which are written as for RP
+def pairwise_from_ballots (registry, ballots):
+	traced = tracing()
+	blank_ballots = 0
+	mentions = [ 0 ] * len(registry)
+
+	rank_vectors = []
+	rank_counts = []
+	ballot_groups = aggregate_ballots(ballots)
+	num_ballots = sum(map(lambda g: g[1], ballot_groups))
+	for i, (ballot, count) in enumerate(ballot_groups):
+		if traced and not i % 10000:
+			trace('validating', done = i, total = len(ballot_groups))
+		ballot_ranks = rp_ballot_ranks(registry, ballot)
+		if ballot_ranks is None:
+			blank_ballots += count
+			continue
+
+		ranks, mentioned = ballot_ranks
+		for cand in mentioned:
+			mentions[cand] += count
+		rank_vectors.append(ranks)
+		rank_counts.append(count)
+
+	matrix = pairwise_matrix(rank_vectors, rank_counts, len(registry))
+	return PairwiseMatrix(registry, matrix, mentions, num_ballots, blank_ballots)
+
+# Takes the matrix of a LiveTally or anything else with the same interface
+def pairwise_from_tally (registry, tally):
+	# The tally goes on changing with the ballots, while a checkpoint must not
+	return PairwiseMatrix(registry, list(map(list, tally.matrix)), list(tally.mentions), tally.num_ballots, tally.blank_ballots)
+
+# Counts an election with a method that finds one winner from a PairwiseMatrix. count_place(pairwise, ignored_ids,
+# tie_breaker_list, profiler) counts a single place, raising TieBreakerNeededException without any checkpoint when
+# it needs a tie breaker it wasn't given. Its results hold the winner under 'winner'
+# With places > 1 the winners are found one after the other from the same pairwise matrix, each time ignoring
+# the previous winners, as if the election was recounted with them added to the ignored candidates
+def count_pairwise (method, count_place, candidates, ballots, ignored_candidates, tie_breaker, places, tally, profiler):
+	profiler.enter('validation')
+	# From here on candidates are counted by their integer id, names are only used for messages and the results
+	registry = pairwise_registry(candidates)
+
+	tie_breaker_list = []
+	if tie_breaker:
+		tie_breaker_list = rp_tie_breaker(registry, tie_breaker)
+
+	# An unknown ignored candidate is most likely a typo, which must not silently count another election
+	ignored_ids = set()
+	for cand in ignored_candidates:
+		if not cand in registry:
+			raise InvalidIgnoredCandidateException(cand)
+		ignored_ids.add(registry.ids[cand])
+
+	# Tally
+	profiler.enter('tally')
+	if tally is None:
+		pairwise = pairwise_from_ballots(registry, ballots)
+	else:
+		pairwise = pairwise_from_tally(registry, tally)
+
+	# Check blank vote count
+	debug('%d ballots cast (%d blank)', pairwise.num_ballots, pairwise.blank_ballots)
+	if pairwise.blank_ballots >= pairwise.num_ballots / 2:
+		raise TooManyBlankBallotsException('Too many blank ballots', pairwise.blank_ballots, pairwise.num_ballots)
+
+	# Everything the places need, which is also the checkpoint the count is resumed from after a tie
+	state = {
+		'method': method,
+		'registry': registry,
+		'ignored_ids': ignored_ids,
+		'places': places,
+		'pairwise': pairwise,
+		'steps': [],
+		'winners': [],
+		'resumed': False
+	}
+	return count_steps(state, count_place, tie_breaker_list, profiler)
+
+# Goes on with a count that needed a tie breaker, from the checkpoint of its TieBreakerNeededException. The ballots
+# aren't tallied again and the places already filled are kept, only the tied place onwards is counted
+def resume_pairwise (checkpoint, count_place, tie_breaker, profiler):
+	profiler.enter('validation')
+	if checkpoint['resumed']:
+		raise ValueError('The count has already been resumed from this checkpoint')
+	if not tie_breaker:
+		raise InvalidTieBreakerException('The tie breaker ballot must contain all candidates')
+	tie_breaker_list = rp_tie_breaker(checkpoint['registry'], tie_breaker)
+	checkpoint['resumed'] = True
+	return count_steps(checkpoint, count_place, tie_breaker_list, profiler)
+
+# Fills the places that are left. Places are only kept once they're done, so a tie in a place makes the count
+# stop with that place and a resumed count starts over with it
+def count_steps (state, count_place, tie_breaker_list, profiler):
+	registry = state['registry']
+	pairwise = state['pairwise']
+	steps = state['steps']
+	winners = state['winners']
+
+	for place in range(len(steps), state['places']):
+		step_ignored_candidates = state['ignored_ids'] | set(map(lambda cand: registry.ids[cand], winners))
+
+		# Stop once there's nobody left to elect, which is an error before anyone was elected at all
+		if not len(pairwise.eligible(step_ignored_candidates)):
+			if place == 0:
+				raise NoEligibleCandidatesException('All candidates are ignored or disqualified')
+			break
+		if place > 0:
+			debug('\nPlace %d', place + 1)
+		trace('place', place = place + 1)
+
+		try:
+			step = count_place(pairwise, step_ignored_candidates, tie_breaker_list, profiler)
+		except TieBreakerNeededException:
+			raise TieBreakerNeededException(state)
+		steps.append(step)
+		winners.append(step['winner'])
+
+	trace('done', winners = winners)
+
+	results = dict(steps[0])
+	results['winners'] = list(winners)
+	results['steps'] = list(steps)
+	return results
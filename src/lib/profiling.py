@@ -0,0 +1,99 @@
+import time
+import tracemalloc
+
+# Records the wall time, amount of calls and peak memory of each phase of a count, as well as of each STV round
+# The count switches between phases with enter(), the time until the next switch is attributed to the current phase
+# Peak memory is measured with tracemalloc, which makes allocations a lot slower, so the times are best compared
+# with each other rather than with unprofiled counts
+class Profiler:
+	def __init__ (self):
+		self.phases = {}
+		self.rounds = []
+		self.current = None
+		self.round_peak = None
+		self.own_tracemalloc = not tracemalloc.is_tracing()
+		if self.own_tracemalloc:
+			tracemalloc.start()
+		tracemalloc.reset_peak()
+		self.start_time = time.perf_counter()
+		self.phase_start = self.start_time
+		self.round_start = None
+
+	# Folds the peak memory since the previous sample into the current phase and round
+	def sample (self):
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.reset_peak()
+		now = time.perf_counter()
+		if self.current is not None:
+			phase = self.phases[self.current]
+			phase['time'] += now - self.phase_start
+			phase['peak_memory'] = max(phase['peak_memory'], peak)
+		if self.round_start is not None:
+			self.round_peak = max(self.round_peak, peak)
+		self.phase_start = now
+		return now
+
+	def enter (self, phase):
+		self.sample()
+		self.current = phase
+		if not phase in self.phases:
+			self.phases[phase] = { 'time': 0, 'calls': 0, 'peak_memory': 0 }
+		self.phases[phase]['calls'] += 1
+
+	# Starts the next round, ending the previous one
+	def round (self):
+		self.end_round()
+		self.round_start = self.phase_start
+		self.round_peak = 0
+
+	def end_round (self):
+		now = self.sample()
+		if self.round_start is not None:
+			self.rounds.append({ 'time': now - self.round_start, 'peak_memory': self.round_peak })
+			self.round_start = None
+		return now
+
+	def stop (self):
+		now = self.end_round()
+		self.current = None
+		self.total_time = now - self.start_time
+		if self.own_tracemalloc:
+			tracemalloc.stop()
+			self.own_tracemalloc = False
+
+	def results (self):
+		profile = {
+			'time': self.total_time,
+			'peak_memory': max(map(lambda phase: phase['peak_memory'], self.phases.values()), default = 0),
+			'phases': self.phases
+		}
+		if len(self.rounds):
+			profile['rounds'] = self.rounds
+		return profile
+
+# Stands in for the profiler when a count isn't profiled
+class NullProfiler:
+	def enter (self, phase):
+		pass
+
+	def round (self):
+		pass
+
+	def end_round (self):
+		pass
+
+	def stop (self):
+		pass
+
+null_profiler = NullProfiler()
+
+# Calls count(*args, profiler) and, if profile is set, adds what the profiler recorded to the results
+def run_profiled (profile, count, *args):
+	profiler = Profiler() if profile else null_profiler
+	try:
+		results = count(*args, profiler)
+	finally:
+		profiler.stop()
+	if profile:
+		results['profile'] = profiler.results()
+	return results
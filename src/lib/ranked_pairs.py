@@ -1,136 +1,153 @@
-from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, TooManyBlankBallotsException, TieBreakerNeededException
-from lib.util import debug
+from itertools import groupby
+
+from lib.exceptions import TieBreakerNeededException
+from lib.util import debug, trace, tracing
+from lib.pairwise import count_pairwise, resume_pairwise
+from lib.profiling import null_profiler, run_profiled
+
+# The graph of locked pairs, along with a bitset per candidate of all candidates reachable from them.
+# Locking winner → loser creates a cycle exactly when the loser already reaches the winner, which is a
+# single bit test, and keeping the bitsets up to date costs one pass over the candidates per locked pair.
+class LockGraph:
+	def __init__ (self, candidates):
+		self.graph = {}
+		self.bits = {}
+		self.reaches = {}
+		for i, cand in enumerate(candidates):
+			self.graph[cand] = []
+			self.bits[cand] = 1 << i
+			self.reaches[cand] = 0
+
+	# Locks the pair unless that would create a cycle, returns whether the pair was locked
+	def lock (self, winner, loser):
+		if self.reaches[loser] & self.bits[winner]:
+			return False
+
+		self.graph[winner].append(loser)
+
+		# Everything reaching the winner (and the winner itself) now also reaches the loser and all it reaches
+		winner_bit = self.bits[winner]
+		new_reaches = self.bits[loser] | self.reaches[loser]
+		for cand, reaches in self.reaches.items():
+			if cand == winner or reaches & winner_bit:
+				self.reaches[cand] = reaches | new_reaches
+
+		return True
+
+# Orders the compared pairs from the greatest to the smallest difference. Pairs with equal differences are
+# ordered per §2.10, looking up where their loser or winner was first listed in constant time.
+def order_pairs (pairs, tie_breaker_list = []):
+	ordered_entries = []
+	first_as_loser = {} # The index of the first ordered pair each candidate lost
+	first_as_winner = {} # The index of the first ordered pair each candidate won
+	tie_breaker_indices = dict(map(lambda x: (x[1], x[0]), reversed(list(enumerate(tie_breaker_list)))))
+
+	def add_entry (entry):
+		first_as_loser.setdefault(entry[1]['loser'], len(ordered_entries))
+		first_as_winner.setdefault(entry[1]['winner'], len(ordered_entries))
+		ordered_entries.append(entry)
+
+	# Takes the equal pair whose loser/winner was listed the earliest as a loser/winner out of equal_pairs
+	def add_first_listed (equal_pairs, key, first_listed):
+		first_i = None
+		first_index = None
+		for i, equal_pair in enumerate(equal_pairs):
+			index = first_listed.get(equal_pair[1][key])
+			if index is not None and (first_index is None or index <= first_index):
+				first_i = i
+				first_index = index
+		if first_i is not None:
+			add_entry(equal_pairs.pop(first_i))
+
+	entries = sorted(pairs.items(), key = lambda entry: -abs(entry[1]['diff']))
+	for diff, group in groupby(entries, key = lambda entry: abs(entry[1]['diff'])):
+		equal_pairs = list(group)
+		if len(equal_pairs) == 1:
+			# No tie
+			add_entry(equal_pairs[0])
+			continue
 
-# Ported from https://github.com/tejoesperanto/vocho-lib/blob/master/src/ranked-pairs.js
-# https://hackernoon.com/the-javascript-developers-guide-to-graphs-and-detecting-cycles-in-them-96f4f619d563
-def is_cyclic (graph):
-	nodes = list(graph.keys())
-	visited = {}
-	rec_stack = {}
-
-	def _is_cyclic (node, visited, rec_stack):
-		if not node in visited or not visited[node]:
-			visited[node] = True
-			rec_stack[node] = True
-			node_neighbors = graph[node]
-			for current_node in node_neighbors:
-				if ((not current_node in visited or not visited[current_node]) and _is_cyclic(current_node, visited, rec_stack) or
-					current_node in rec_stack and rec_stack[current_node]):
-					return True
-		rec_stack[node] = False
-		return False
-
-	for node in nodes:
-		if _is_cyclic(node, visited, rec_stack):
-			return True
-
-	return False
-
-def RankedPairs (candidates, ballots, ignored_candidates = [], tie_breaker = None):
-	candidates = list(candidates)
-	candidates.sort()
-
-	tie_breaker_list = []
-	if tie_breaker:
-		tie_breaker_list = tie_breaker.split('>')
-
-		if len(set(tie_breaker_list)) != len(tie_breaker_list):
-			raise InvalidTieBreakerException('The tie breaker ballot must not contain duplicate candidates')
-
-		if len(tie_breaker_list) < len(candidates):
-			raise InvalidTieBreakerException('The tie breaker ballot must contain all candidates')
-
-		for cand in tie_breaker_list:
-			if not cand in candidates:
-				raise InvalidTieBreakerException('Invalid candidate %s in tie breaker' % (cand))
-
-	# Create pairs
-	pairs = {}
-	for i, cand1 in enumerate(candidates):
-		for cand2 in candidates[i + 1:]:
-			pair_name = cand1 + cand2
-			pair = pairs[pair_name] = {
-				'diff': 0,
-				'winner': None,
-				'loser': None,
-				cand1: 0,
-				cand2: 0
-			}
+		# We have a tie, follow §2.10
+		# The equal pairs are considered from the last one to the first one
+		equal_pairs.reverse()
+
+		# 1. The equal pair with a loser that's already listed as a loser is put first
+		add_first_listed(equal_pairs, 'loser', first_as_loser)
+
+		# 2. The pair with a winner that's already listed as a winner is put first
+		add_first_listed(equal_pairs, 'winner', first_as_winner)
+
+		if len(equal_pairs) > 1:
+			# 3. The pair with a loser that is least preferred by the tie breaker balllot is put first
+			if not len(tie_breaker_list):
+				raise TieBreakerNeededException()
+
+			loser_pref_indices = list(map(lambda entry: tie_breaker_indices[entry[1]['loser']], equal_pairs))
+			new_ordered_tie_breaker_pairs = []
+			for i, index in enumerate(loser_pref_indices):
+				if i + 1 == len(loser_pref_indices) or loser_pref_indices[i + 1] > index:
+					new_ordered_tie_breaker_pairs.append(i)
+			for i in reversed(new_ordered_tie_breaker_pairs):
+				add_entry(equal_pairs.pop(i))
+
+		# There should only be one pair remaining at this point
+		for equal_pair in equal_pairs:
+			add_entry(equal_pair)
+
+	return ordered_entries
+
+# Counts one Ranked Pairs winner from an already tallied pairwise matrix. The candidates are counted by their id,
+# which is their index in names: matrix[i][j] is the amount of voters preferring candidate i over candidate j and
+# mentions[i] is the amount of ballots mentioning candidate i
+def count_ranked_pairs (names, matrix, mentions, num_ballots, blank_ballots, ignored_candidates = set(), tie_breaker_list = [], profiler = null_profiler):
+	profiler.enter('pairs')
+	candidates = list(range(len(names)))
 
-	# Tally
-	blank_ballots = 0
 	cand_stats = {}
 	for cand in candidates:
 		cand_stats[cand] = {
 			'won': 0,
 			'lost': 0,
-			'mentions': 0
+			'mentions': mentions[cand]
 		}
 
-	for ballot in ballots:
-		already_mentioned = []
-
-		rows = ballot.split('>')
-		# Turn blank votes into an empty list
-		rows = list(filter(lambda row: len(row), rows))
-		rows = list(map(lambda row: row.split('='), rows))
-		
-		if not len(rows):
-			blank_ballots += 1
-			continue
-
-		for y, cur_row in enumerate(rows):
-			for cur_col in cur_row:
-				if not cur_col in candidates:
-					raise InvalidBallotException('Invalid candidate %s in ballot %s' % (cur_col, ballot))
-				if cur_col in already_mentioned:
-					raise InvalidBallotException('Duplicate candidate %s in ballot %s' % (cur_col, ballot))
-				already_mentioned.append(cur_col)
-				cand_stats[cur_col]['mentions'] += 1
-
-		# Consider candidates not mentioned as lesser than those mentioned
-		rows.append(list(set(candidates) - set(already_mentioned)))
-		print(rows)
-
-		for y, cur_row in enumerate(rows):
-			for cur_col in cur_row:
-				for lesser_row in rows[y + 1:]:
-					for lesser_col in lesser_row:
-						if not lesser_col in candidates:
-							raise InvalidBallotException('Invalid candidate %s in ballot %s' % (cur_col, ballot))
-						if lesser_col == cur_col:
-							raise InvalidBallotException('Duplicate candidate %s in ballot %s' % (cur_col, ballot))
-						pair_name = ''.join(sorted(( cur_col, lesser_col )))
-						pairs[pair_name][cur_col] += 1
-
-	# Check blank vote count
-	debug('%d ballots cast (%d blank)' % (len(ballots), blank_ballots))
-	if blank_ballots >= len(ballots) / 2:
-		raise TooManyBlankBallotsException('Too many blank ballots', blank_ballots, len(ballots))
+	traced = tracing() # Only build the trace events if anyone is listening
 
 	# Disqualify candidates as needed
+	remaining_candidates = []
 	disqualified_candidates = []
 	for cand, stats in cand_stats.items():
 		is_ignored = cand in ignored_candidates
-		has_insufficient_mentions = stats['mentions'] < len(ballots) / 2
+		has_insufficient_mentions = stats['mentions'] < num_ballots / 2
 
-		if (is_ignored or has_insufficient_mentions):
-			candidates.remove(cand)
-
-			for pair_name in dict(pairs):
-				cands = list(pair_name)
-				if cand in cands:
-					del pairs[pair_name]
+		if not (is_ignored or has_insufficient_mentions):
+			remaining_candidates.append(cand)
 
 		if is_ignored:
-			debug('%s is ignored in this election' % (cand))
+			debug('%s is ignored in this election', names[cand])
+			if traced:
+				trace('ignored', candidate = names[cand])
 		elif has_insufficient_mentions:
 			disqualified_candidates.append(cand)
-			debug('%s is disqualified due to insufficient mentions' % (cand))
+			debug('%s is disqualified due to insufficient mentions', names[cand])
+			if traced:
+				trace('disqualified', candidate = names[cand], mentions = stats['mentions'])
+
+	# Create the pairs of the remaining candidates
+	pairs = {}
+	for i, cand1 in enumerate(remaining_candidates):
+		for cand2 in remaining_candidates[i + 1:]:
+			pairs[(cand1, cand2)] = {
+				'diff': 0,
+				'winner': None,
+				'loser': None,
+				cand1: matrix[cand1][cand2],
+				cand2: matrix[cand2][cand1]
+			}
 
 	# Determine the results of the compared pairs
-	for pair_name, pair in pairs.items():
-		cand1, cand2 = list(pair_name)
+	tie_breaker_indices = dict(map(lambda x: (x[1], x[0]), reversed(list(enumerate(tie_breaker_list)))))
+	for (cand1, cand2), pair in pairs.items():
 		pair['diff'] = pair[cand1] - pair[cand2]
 
 		if pair[cand1] > pair[cand2]:
@@ -144,13 +161,10 @@ def RankedPairs (candidates, ballots, ignored_candidates = [], tie_breaker = Non
 			pair['winner'] = cand2
 			pair['loser'] = cand1
 		else:
-			if not tie_breaker:
+			if not len(tie_breaker_list):
 				raise TieBreakerNeededException()
 
-			cand1_index = tie_breaker_list.index(cand1)
-			cand2_index = tie_breaker_list.index(cand2)
-
-			if cand1_index < cand2_index:
+			if tie_breaker_indices[cand1] < tie_breaker_indices[cand2]:
 				cand_stats[cand1]['won'] += 1
 				cand_stats[cand2]['lost'] += 1
 				pair['winner'] = cand1
@@ -161,167 +175,95 @@ def RankedPairs (candidates, ballots, ignored_candidates = [], tie_breaker = Non
 				pair['winner'] = cand2
 				pair['loser'] = cand1
 
-	debug('\nCompared pairs:')
-	debug(pairs)
-
-	debug('\nCandidate pair scores:')
-	debug(cand_stats)
-
 	# Order the pairs
-	ordered_entries = []
-	entries = list(pairs.items())
-	while len(entries):
-		max_diff = -1
-		max_diff_indices = None
-
-		for i, pair in enumerate(entries):
-			abs_diff = abs(pair[1]['diff'])
-			if abs_diff > max_diff:
-				max_diff = abs_diff
-				max_diff_indices = [ i ]
-			elif abs_diff == max_diff:
-				max_diff_indices.append(i)
-
-		if len(max_diff_indices) == 1:
-			# No tie
-			pair = entries[max_diff_indices[0]]
-			ordered_entries.append(pair)
-			entries.pop(max_diff_indices[0])
-		else:
-			# We have a tie, follow §2.10
-			# Obtain the pairs, from the highest index to the lowest as to not mess up the indices when popping
-			max_diff_indices.sort(reverse=True)
-			equal_pairs = []
-			for i in max_diff_indices:
-				equal_pairs.append(entries[i])
-				entries.pop(i)
-
-			# 1. The equal pair with a loser that's already listed as a loser is put first
-			loser_entries = [] # All losers that are already in the ordered pairs
-			for i, equal_pair in enumerate(equal_pairs):
-				# Find the loser of the equal pair
-				equal_pair_loser = equal_pair[1]['loser']
-
-				# Check if the loser is already in the ordered pairs as a loser
-				ordered_index = None
-				for n, ordered_entry in enumerate(ordered_entries):
-					ordered_loser = ordered_entry[1]['loser']
-					if equal_pair_loser == ordered_loser:
-						ordered_index = n
-						break
-				if ordered_index is not None:
-					loser_entries.append({ 'eq_i': i, 'or_i': ordered_index })
-			loser_entries.sort(reverse=True, key = lambda x: x['or_i']) # Don't mess up indices when popping
-
-			new_ordered_loser_entries = []
-			for i, loser_entry in enumerate(loser_entries):
-				next_loser_entry = None
-				try:
-					next_loser_entry = loser_entries[i + 1]
-				except IndexError:
-					pass
-				if next_loser_entry is None or next_loser_entry['or_i'] > loser_entry['or_i']:
-					new_ordered_loser_entries.append(loser_entry['eq_i'])
-			new_ordered_loser_entries.sort(reverse=True) # Don't mess up indices when popping
-			for i in new_ordered_loser_entries:
-				ordered_entries.append(equal_pairs[i])
-				equal_pairs.pop(i)
-
-			# 2. The pair with a winner that's already listed as a winner is put first
-			winner_entries = [] # All winners that are already in the ordered pairs
-			for i, equal_pair in enumerate(equal_pairs):
-				# Find the winner of the equal pair
-				equal_pair_winner = equal_pair[1]['winner']
-
-				# Check if the winner is already in the ordered pairs as a winner
-				ordered_index = None
-				for n, ordered_entry in enumerate(ordered_entries):
-					ordered_winner = ordered_entry[1]['winner']
-					if equal_pair_winner == ordered_winner:
-						ordered_index = n
-						break
-				if ordered_index is not None:
-					winner_entries.append({ 'eq_i': i, 'or_i': ordered_index })
-			winner_entries.sort(reverse=True, key = lambda x: x['or_i']) # Don't mess up indices when popping
-
-			new_ordered_winner_entries = []
-			for i, winner_entry in enumerate(winner_entries):
-				next_winner_entry = None
-				try:
-					next_winner_entry = winner_entries[i + 1]
-				except IndexError:
-					pass
-				if next_winner_entry is None or next_winner_entry['or_i'] > winner_entry['or_i']:
-					new_ordered_winner_entries.append(winner_entry['eq_i'])
-			new_ordered_winner_entries.sort(reverse=True) # Don't mess up indices when popping
-			for i in new_ordered_winner_entries:
-				ordered_entries.append(equal_pairs[i])
-				equal_pairs.pop(i)
-
-			if len(equal_pairs) > 1:
-				# 3. The pair with a loser that is least preferred by the tie breaker balllot is put first
-				if not tie_breaker:
-					raise TieBreakerNeededException()
-
-				loser_pref_indices = []
-				for i, equal_pair_entry in enumerate(equal_pairs):
-					loser = equal_pair_entry[1]['loser']
-					loser_pref_indices.append({ 'eq_i': i, 'or_i': tie_breaker_list.index(loser) })
-
-				new_ordered_tie_breaker_pairs = []
-				for i, pair in enumerate(loser_pref_indices):
-					next_pair = None
-					try:
-						next_pair = loser_pref_indices[i + 1]
-					except IndexError:
-						pass
-					if (next_pair is None or next_pair['or_i'] > pair['or_i']):
-						new_ordered_tie_breaker_pairs.append(pair['eq_i'])
-				new_ordered_tie_breaker_pairs.sort(reverse=True) # Don't mess up indices when popping
-				for i in new_ordered_tie_breaker_pairs:
-					ordered_entries.append(equal_pairs[i])
-					equal_pairs.pop(i)
-
-			# There should only be one pair remaining at this point
-			ordered_entries.extend(equal_pairs)
-
-	debug('\nRanked pairs')
-	debug(ordered_entries)
+	profiler.enter('ordering')
+	ordered_entries = order_pairs(pairs, tie_breaker_list)
 
 	# Make a graph of the winning pairs
-	lock = {}
-	for cand in candidates:
-		lock[cand] = []
+	profiler.enter('locking')
+	lock_graph = LockGraph(remaining_candidates)
+	lock = lock_graph.graph
 	lock_entries = []
 	debug('\nLock:')
 	for entry in ordered_entries:
 		pair = entry[1]
 
-		lock[pair['winner']].append(pair['loser'])
-		if is_cyclic(lock):
-			lock[pair['winner']].remove(pair['loser'])
+		if not lock_graph.lock(pair['winner'], pair['loser']):
+			if traced:
+				trace('skipped', winner = names[pair['winner']], loser = names[pair['loser']], diff = pair['diff'])
 			continue
-		lock_entries.append((pair['winner'], pair['loser']))
+		lock_entries.append((names[pair['winner']], names[pair['loser']]))
 
-		debug('%s → %s' % (pair['winner'], pair['loser']))
+		debug('%s → %s', names[pair['winner']], names[pair['loser']])
+		if traced:
+			trace('locked', winner = names[pair['winner']], loser = names[pair['loser']], diff = pair['diff'])
 
 	# Find the candidate at the root of graph (with nothing pointing to it)
-	possible_winners = list(candidates)
+	possible_winners = list(remaining_candidates)
 	cands_pointed_to = set(item for sublist in lock.values() for item in sublist)
 	for cand in cands_pointed_to:
 		possible_winners.remove(cand)
 	winner = possible_winners[0]
 
-	debug('\nWinner: %s' % (winner))
+	# Map the candidate ids back to their names
+	profiler.enter('results')
+	named_pairs = {}
+	for (cand1, cand2), pair in pairs.items():
+		named_pairs[(names[cand1], names[cand2])] = {
+			'diff': pair['diff'],
+			'winner': names[pair['winner']],
+			'loser': names[pair['loser']],
+			# Kept apart from the other keys, which a candidate may well be named after
+			'votes': {
+				names[cand1]: pair[cand1],
+				names[cand2]: pair[cand2]
+			}
+		}
+	named_entries = []
+	for (cand1, cand2), pair in ordered_entries:
+		pair_name = (names[cand1], names[cand2])
+		named_entries.append((pair_name, named_pairs[pair_name]))
+	named_cand_stats = dict(map(lambda x: (names[x[0]], x[1]), cand_stats.items()))
+	named_lock = {}
+	for cand, losers in lock.items():
+		named_lock[names[cand]] = list(map(lambda loser: names[loser], losers))
+
+	debug('\nCompared pairs:\n%s', named_pairs)
+	debug('\nCandidate pair scores:\n%s', named_cand_stats)
+	debug('\nRanked pairs\n%s', named_entries)
+	debug('\nWinner: %s', names[winner])
+	if traced:
+		trace('winner', candidate = names[winner])
 
 	return {
-		'ballots': len(ballots),
+		'ballots': num_ballots,
 		'blank_ballots': blank_ballots,
-		'winner': winner,
-		'disqualified_candidates': disqualified_candidates,
-		'comp_pairs': pairs,
-		'ranked_pairs': ordered_entries,
-		'cand_stats': cand_stats,
+		'winner': names[winner],
+		'disqualified_candidates': list(map(lambda cand: names[cand], disqualified_candidates)),
+		'comp_pairs': named_pairs,
+		'ranked_pairs': named_entries,
+		'cand_stats': named_cand_stats,
 		'lock': lock_entries,
-		'graph': lock
+		'graph': named_lock
 	}
+
+# Counts one place from a PairwiseMatrix, see count_pairwise
+def count_rp_place (pairwise, ignored_ids, tie_breaker_list, profiler):
+	return count_ranked_pairs(pairwise.names, pairwise.matrix, pairwise.mentions, pairwise.num_ballots, pairwise.blank_ballots,
+		ignored_ids, tie_breaker_list, profiler)
+
+# Ported from https://github.com/tejoesperanto/vocho-lib/blob/master/src/ranked-pairs.js
+# With places > 1 the winners are found one after the other from the same pairwise matrix, each time ignoring
+# the previous winners, as if the election was recounted with them added to the ignored candidates
+# With profile set the results also hold the time and memory spent on each phase of the count
+def RankedPairs (candidates, ballots, ignored_candidates = [], tie_breaker = None, places = 1, profile = False):
+	return run_profiled(profile, count_pairwise, 'RP', count_rp_place, candidates, ballots, ignored_candidates, tie_breaker, places, None)
+
+# Counts from the pairwise matrix of a LiveTally, so only the pairs are left to be ranked and locked
+def RankedPairsFromTally (tally, ignored_candidates = [], tie_breaker = None, places = 1, profile = False):
+	return run_profiled(profile, count_pairwise, 'RP', count_rp_place, tally.candidates, None, ignored_candidates, tie_breaker, places, tally)
+
+# Goes on with a count that needed a tie breaker, from the checkpoint of its TieBreakerNeededException. The ballots
+# aren't tallied again and the places already filled are kept, only the tied place onwards is counted
+def RankedPairsResume (checkpoint, tie_breaker, profile = False):
+	return run_profiled(profile, resume_pairwise, checkpoint, count_rp_place, tie_breaker)
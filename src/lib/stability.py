@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+# Measures how stable the result of an election is by counting it again on many resamples of its ballots, e.g.
+#   python -m lib.stability STV -c A,B,C,D -p 2 ballots.txt -n 1000
+#   python -m lib.stability RP -c A,B,C --leave-out 5 -j 4 < ballots.txt
+# Bootstrap samples draw as many ballots as were cast, with replacement, while leave-k-out samples drop k random
+# ballots. The report tells how often each candidate won or was elected and how the margins were spread
+#
+# The ballots are aggregated and parsed once and every sample is a vector of counts of the distinct ballots, drawn
+# in the worker process from its own seed, so nothing but seeds and outcomes goes between the processes. A sample is
+# counted from the parsed ballots as they are, weighted by its counts, without validating or tallying them again
+
+import argparse
+import json
+import random
+import sys
+from bisect import bisect
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+
+from lib.election import election_methods, count_election, count_tally, jsonable
+from lib.ballots import CandidateRegistry, parse_candidates, aggregate_ballots
+from lib.pairwise import pairwise_matrix, pairwise_registry, rp_ballot_ranks
+from lib.stv import stv_ballot_prefs
+from lib.validation import check_aggregate_ballots
+from lib.util import optional_numpy
+from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, NoEligibleCandidatesException, TooManyBlankBallotsException, TieBreakerNeededException
+
+# The counts of the distinct ballots in the sample of a (seed, replicate) pair, with NumPy if available
+# The same pair always gives the same sample, though not with and without NumPy
+def sample_counts (counts, leave_out, sample_seed):
+	num_ballots = sum(counts)
+	np = optional_numpy()
+	if np is not None:
+		rng = np.random.default_rng(list(sample_seed))
+		counts = np.array(counts, dtype = np.int64)
+		if leave_out:
+			return (counts - rng.multivariate_hypergeometric(counts, leave_out)).tolist()
+		return rng.multinomial(num_ballots, counts / num_ballots).tolist()
+
+	rng = random.Random('%d-%d' % sample_seed)
+	cum_counts = list(accumulate(counts))
+	if leave_out:
+		sample = list(counts)
+		for ballot in rng.sample(range(num_ballots), leave_out):
+			sample[bisect(cum_counts, ballot)] -= 1
+		return sample
+	drawn = Counter(rng.choices(range(len(counts)), cum_weights = cum_counts, k = num_ballots))
+	return list(map(lambda i: drawn[i], range(len(counts))))
+
+# The distinct ballots of an election parsed once, with the same interface as a LiveTally for the counts of a
+# sample: STV counts from the parsed ballot groups and the other methods from the pairwise matrix of the rank
+# vectors, both weighted by the counts of the sample
+class SampledTally:
+	def __init__ (self, method, candidates, ballots):
+		self.method = method
+		self.candidates = list(candidates)
+		if method != 'STV':
+			registry = pairwise_registry(self.candidates)
+			self.parsed = list(map(lambda ballot: rp_ballot_ranks(registry, ballot), ballots))
+		else:
+			registry = CandidateRegistry(self.candidates)
+			self.parsed = list(map(lambda ballot: stv_ballot_prefs(registry, ballot), ballots))
+		self.num_candidates = len(registry)
+		self.sample([ 0 ] * len(ballots))
+
+	# Sets the count of each distinct ballot
+	def sample (self, counts):
+		self.num_ballots = sum(counts)
+		self.blank_ballots = 0
+		if self.method == 'STV':
+			self.groups = []
+			for prefs, count in zip(self.parsed, counts):
+				if not count:
+					continue
+				if not len(prefs):
+					self.blank_ballots += count
+				self.groups.append((prefs, count))
+			return
+
+		self.mentions = [ 0 ] * self.num_candidates
+		rank_vectors = []
+		rank_counts = []
+		for parsed, count in zip(self.parsed, counts):
+			if not count:
+				continue
+			if parsed is None:
+				self.blank_ballots += count
+				continue
+			ranks, mentioned = parsed
+			for cand in mentioned:
+				self.mentions[cand] += count
+			rank_vectors.append(ranks)
+			rank_counts.append(count)
+		self.matrix = pairwise_matrix(rank_vectors, rank_counts, self.num_candidates)
+
+	def ballot_groups (self):
+		return self.groups
+
+# How close the result was, in votes: for RP and the other Condorcet methods the smallest amount of voters by
+# which the winner beat another remaining candidate (negative if the winner lost a pair), for STV the gap between
+# the weakest winner and the strongest other candidate in the last round where both were still counted
+def result_margin (method, results):
+	if method != 'STV':
+		winner = results['winner']
+		margins = []
+		for pair_name, pair in results['steps'][0]['comp_pairs'].items():
+			if winner in pair_name:
+				other = pair_name[0] if pair_name[1] == winner else pair_name[1]
+				margins.append(pair['votes'][winner] - pair['votes'][other])
+		return min(margins, default = None)
+
+	winners = set(results['winners'])
+	for stv_round in reversed(results['rounds']):
+		winner_votes = list(map(lambda x: x[1], filter(lambda x: x[0] in winners, stv_round['votes'].items())))
+		other_votes = list(map(lambda x: x[1], filter(lambda x: not x[0] in winners, stv_round['votes'].items())))
+		if len(winner_votes) and len(other_votes):
+			return min(winner_votes) - max(other_votes)
+	return None
+
+# Set in each worker process by init_worker, so that the ballots only have to be sent once
+worker_election = None
+
+def init_worker (election):
+	global worker_election
+	worker_election = election
+
+# Counts the samples of the given (seed, replicate) pairs, returning the winners and margin of each or the error
+# it ran into
+def count_samples (sample_seeds):
+	election = worker_election
+	outcomes = []
+	for sample_seed in sample_seeds:
+		tally = election['tally']
+		tally.sample(sample_counts(election['counts'], election['leave_out'], sample_seed))
+		try:
+			results = count_tally(
+				election['method'],
+				tally,
+				election['ignored_candidates'],
+				election['places'],
+				election['tie_breaker']
+			)
+		except (TooManyBlankBallotsException, TieBreakerNeededException, NoEligibleCandidatesException) as e:
+			outcomes.append({ 'error': type(e).__name__ })
+			continue
+		outcomes.append({ 'winners': results['winners'], 'margin': result_margin(election['method'], results) })
+	return outcomes
+
+def margin_summary (margins):
+	if not len(margins):
+		return None
+	margins = sorted(margins)
+	def quantile (q):
+		return margins[min(len(margins) - 1, int(q * len(margins)))]
+	return {
+		'min': margins[0],
+		'p5': quantile(0.05),
+		'p25': quantile(0.25),
+		'median': quantile(0.5),
+		'p75': quantile(0.75),
+		'p95': quantile(0.95),
+		'max': margins[-1],
+		'mean': sum(margins) / len(margins)
+	}
+
+# Counts the election once as it is and then on every sample, in a pool of worker processes unless workers is 1
+# With leave_out set the samples leave out that many ballots instead of being bootstrapped
+# The same seed gives the same report whatever the amount of workers
+def analyze_stability (method, candidates, ballots, ignored_candidates = [], places = 1, tie_breaker = None,
+	replicates = 1000, leave_out = 0, seed = 0, workers = None, chunk_size = 50):
+	ballot_groups = aggregate_ballots(ballots)
+	election = {
+		'method': method,
+		'candidates': candidates,
+		'ignored_candidates': ignored_candidates,
+		'places': places,
+		'tie_breaker': tie_breaker,
+		'counts': list(map(lambda g: g[1], ballot_groups)),
+		'leave_out': leave_out
+	}
+	num_ballots = sum(election['counts'])
+	if leave_out < 0 or leave_out >= num_ballots:
+		raise ValueError('Can\'t leave out %d of %d ballots' % (leave_out, num_ballots))
+
+	results = count_election(method, candidates, dict(ballot_groups), ignored_candidates, places, tie_breaker)
+	# Only once the ballots are known to be valid
+	election['tally'] = SampledTally(method, candidates, list(map(lambda g: g[0], ballot_groups)))
+
+	sample_seeds = list(map(lambda i: (seed, i), range(replicates)))
+	chunks = list(map(lambda i: sample_seeds[i:i + chunk_size], range(0, replicates, chunk_size)))
+	if workers == 1:
+		init_worker(election)
+		outcome_chunks = list(map(count_samples, chunks))
+	else:
+		with ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (election,)) as executor:
+			outcome_chunks = list(executor.map(count_samples, chunks))
+	outcomes = [ outcome for outcome_chunk in outcome_chunks for outcome in outcome_chunk ]
+
+	counted = list(filter(lambda outcome: not 'error' in outcome, outcomes))
+	def share (amount):
+		return amount / len(counted) if len(counted) else None
+	first = Counter(map(lambda outcome: outcome['winners'][0], counted))
+	elected = Counter(cand for outcome in counted for cand in outcome['winners'])
+	same_result = len(list(filter(lambda outcome: set(outcome['winners']) == set(results['winners']), counted)))
+	margins = list(filter(lambda margin: margin is not None, map(lambda outcome: outcome['margin'], counted)))
+
+	return {
+		'method': method,
+		'resampling': 'leave_%d_out' % (leave_out) if leave_out else 'bootstrap',
+		'replicates': replicates,
+		'seed': seed,
+		'winners': results['winners'],
+		'margin': result_margin(method, results),
+		'same_result': share(same_result),
+		'first': dict(map(lambda cand: (cand, share(first[cand])), candidates)),
+		'elected': dict(map(lambda cand: (cand, share(elected[cand])), candidates)),
+		'margins': margin_summary(margins),
+		'errors': dict(Counter(map(lambda outcome: outcome['error'], filter(lambda outcome: 'error' in outcome, outcomes))))
+	}
+
+def main (argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m lib.stability', description = 'Count an election again on many resamples of its ballots')
+	parser.add_argument('method', type = str.upper, choices = election_methods)
+	parser.add_argument('ballots', nargs = '?', default = '-', help = 'file to read the ballots from, - (default) for stdin')
+	parser.add_argument('-c', '--candidates', required = True, help = 'the candidates separated by commas')
+	parser.add_argument('-i', '--ignored', default = '', help = 'the ignored candidates separated by commas')
+	parser.add_argument('-p', '--places', type = int, default = 1)
+	parser.add_argument('-t', '--tie-breaker', help = 'the tie breaker ballot, e.g. A>B>D>C for RP or ABDC for STV')
+	parser.add_argument('-n', '--replicates', type = int, default = 1000, help = 'amount of samples to count (default: 1000)')
+	parser.add_argument('-k', '--leave-out', type = int, default = 0, help = 'leave out this many ballots per sample instead of bootstrapping')
+	parser.add_argument('-s', '--seed', type = int, default = 0)
+	parser.add_argument('-j', '--jobs', type = int, help = 'amount of worker processes (default: one per core)')
+	args = parser.parse_intermixed_args(argv)
+
+	candidates = parse_candidates(args.candidates)
+	ignored_candidates = parse_candidates(args.ignored)
+
+	ballots_file = sys.stdin if args.ballots == '-' else open(args.ballots, encoding = 'utf8')
+	try:
+		ballots = check_aggregate_ballots(args.method, candidates, ballots_file)
+		report = analyze_stability(args.method, candidates, ballots, ignored_candidates, args.places,
+			args.tie_breaker, args.replicates, args.leave_out, args.seed, args.jobs)
+	except TieBreakerNeededException:
+		print('A tie breaker is needed, pass it with --tie-breaker', file = sys.stderr)
+		return 3
+	except TooManyBlankBallotsException as e:
+		print('Too many blank ballots (%d of %d)' % (e.blank_ballots, e.num_ballots), file = sys.stderr)
+		return 2
+	except (InvalidTieBreakerException, InvalidBallotException, NoEligibleCandidatesException, ValueError) as e:
+		print(e, file = sys.stderr)
+		for problem in getattr(e, 'problems', []):
+			print('line %d: %s' % (problem['line'], problem['message']), file = sys.stderr)
+		return 1
+	finally:
+		if ballots_file is not sys.stdin:
+			ballots_file.close()
+
+	json.dump(jsonable(report), sys.stdout, ensure_ascii = False, indent = '\t')
+	print()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+# Times how long Voĉo takes to start, each in a fresh Python process, e.g.
+#   python -m lib.startup
+#   python -m lib.startup -r 20 --paths cli gui -o startup.json
+# engines: importing the counting code, as a script using it would
+# cli: counting a tiny election with python -m lib.cli
+# gui: starting main.py until its window is up, offscreen unless QT_QPA_PLATFORM says otherwise
+# Neither path should pull in Qt or NumPy before it needs them, so the modules each one imported are listed too
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from lib.util import git_commit
+
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# The command of each path and what it's given on stdin
+startup_paths = {
+	'engines': ([ sys.executable, '-c', 'import lib.election, lib.export' ], None),
+	'cli': ([ sys.executable, '-m', 'lib.cli', 'RP', '-c', 'A,B,C', '-t', 'A>B>C' ], 'A>B>C\nC>B=A\nB>A\n'),
+	'gui': ([ sys.executable, os.path.join(src_path, 'main.py') ], None)
+}
+
+# Packages worth knowing whether a path imported
+heavy_modules = [ 'PyQt5', 'numpy' ]
+
+def time_startup (path, repeat = 10):
+	command, stdin = startup_paths[path]
+	env = dict(os.environ)
+	env['VOCHO_EXIT_AFTER_STARTUP'] = '1'
+	env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+	times = []
+	for i in range(repeat):
+		start_time = time.perf_counter()
+		subprocess.run(command, input = stdin, cwd = src_path, env = env, capture_output = True, text = True, check = True)
+		times.append(time.perf_counter() - start_time)
+
+	# One more run to see what was imported, which -X importtime writes to stderr
+	imports = subprocess.run(command[:1] + [ '-X', 'importtime' ] + command[1:], input = stdin, cwd = src_path, env = env,
+		capture_output = True, text = True, check = True).stderr
+	imported = set(map(lambda line: line.rsplit('|', 1)[-1].strip(), filter(lambda line: line.startswith('import time:'), imports.split('\n'))))
+
+	return {
+		'path': path,
+		'min': min(times),
+		'median': statistics.median(times),
+		'max': max(times),
+		'imports': dict(map(lambda module: (module, module in imported), heavy_modules))
+	}
+
+def main (argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m lib.startup', description = 'Time the startup of the engines, the CLI and the GUI')
+	parser.add_argument('--paths', nargs = '+', choices = list(startup_paths), default = list(startup_paths))
+	parser.add_argument('-r', '--repeat', type = int, default = 10, help = 'start every path this many times (default: 10)')
+	parser.add_argument('-o', '--output', help = 'file to write the JSON results to (default: stdout)')
+	args = parser.parse_args(argv)
+
+	report = {
+		'commit': git_commit(),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'results': []
+	}
+
+	for path in args.paths:
+		entry = time_startup(path, args.repeat)
+		report['results'].append(entry)
+		print('%s: %.3f s (median %.3f s)' % (path, entry['min'], entry['median']), file = sys.stderr)
+
+	if args.output:
+		with open(args.output, 'w', encoding = 'utf8') as f:
+			json.dump(report, f, ensure_ascii = False, indent = '\t')
+	else:
+		json.dump(report, sys.stdout, ensure_ascii = False, indent = '\t')
+		print()
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -1,79 +1,354 @@
-import sys
 from functools import reduce
 
-from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, TooManyBlankBallotsException, TieBreakerNeededException
-from lib.util import debug
+from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, InvalidIgnoredCandidateException, TooManyBlankBallotsException, TieBreakerNeededException
+from lib.util import debug, lazy, trace, tracing
+from lib.ballots import aggregate_ballots, CandidateRegistry
+from lib.profiling import run_profiled
+from lib.validation import parse_ranking
+
+# Reports the progress through the ballot groups every so often, which is also where a count can be cancelled
+def tallying (i, ballot_groups):
+	if not i % 10000 and tracing():
+		trace('tallying', done = i, total = len(ballot_groups))
+
+# The original engine: every ballot's remaining preferences are kept as a sequence, the piles are found
+# by scanning all ballots and excluded candidates are removed from every ballot
+class ScanBallots:
+	def __init__ (self, ballot_groups, weight = 1):
+		self.ballots = []
+		for i, (prefs, count) in enumerate(ballot_groups):
+			tallying(i, ballot_groups)
+			self.ballots.append({ 'prefs': prefs, 'weight': weight, 'count': count })
+
+	# All ballots with the candidate as their current first preference, in ballot order
+	def pile (self, cand):
+		pile = []
+		for ballot in self.ballots:
+			try:
+				if ballot['prefs'][0] == cand:
+					pile.append(ballot)
+			except IndexError:
+				pass
+		return pile
+
+	def exclude (self, cand):
+		for ballot in self.ballots:
+			prefs = ballot['prefs']
+			if cand in prefs:
+				i = prefs.index(cand)
+				ballot['prefs'] = prefs[:i] + prefs[i + 1:]
+
+	def head (self, ballot):
+		try:
+			return ballot['prefs'][0]
+		except IndexError:
+			return None
+
+# Keeps an index from each continuing candidate to the ballots currently headed by them. Each ballot has a
+# cursor to its current preference that skips excluded candidates, so excluding a candidate only touches
+# their own pile.
+#
+# The rounds of a count of 1 000 000 ballots ranking up to 6 of 30 candidates (nearly all distinct) for 5 places
+# take ~3.6 s with this engine against ~7.7 s with the scan engine, and ~1.8 s against ~2.4 s for 100 000
+# ballots ranking up to 5 of 40 candidates. The gain grows with the number of rounds and shrinks with the
+# length of the ballots, as each ballot's cursor passes every preference at most once.
+class PileBallots:
+	def __init__ (self, ballot_groups, weight = 1):
+		self.ballots = []
+		self.excluded = set()
+		self.piles = {}
+		for i, (prefs, count) in enumerate(ballot_groups):
+			tallying(i, ballot_groups)
+			self.ballots.append({ 'prefs': prefs, 'weight': weight, 'count': count, 'cursor': 0 })
+			if len(prefs):
+				self.piles.setdefault(prefs[0], []).append(i)
+
+	# All ballots with the candidate as their current first preference, in ballot order so that
+	# floating point sums come out exactly as with the scan engine
+	def pile (self, cand):
+		return list(map(lambda i: self.ballots[i], sorted(self.piles.get(cand, []))))
+
+	# Advance the cursor of each ballot in the candidate's pile past excluded candidates and
+	# move the ballot to the pile of its new first preference
+	def exclude (self, cand):
+		excluded = self.excluded
+		excluded.add(cand)
+		ballots = self.ballots
+		piles = self.piles
+		for i in piles.pop(cand, []):
+			ballot = ballots[i]
+			prefs = ballot['prefs']
+			end = len(prefs)
+			cursor = ballot['cursor'] + 1
+			while cursor < end and prefs[cursor] in excluded:
+				cursor += 1
+			ballot['cursor'] = cursor
+			if cursor < end:
+				next_pref = prefs[cursor]
+				if next_pref in piles:
+					piles[next_pref].append(i)
+				else:
+					piles[next_pref] = [ i ]
+
+	def head (self, ballot):
+		if ballot['cursor'] < len(ballot['prefs']):
+			return ballot['prefs'][ballot['cursor']]
+		return None
+
+stv_engines = {
+	'scan': ScanBallots,
+	'piles': PileBallots
+}
+
+# Turns a ballot into the sequence of its candidate ids, which is empty for a blank ballot
+def stv_ballot_prefs (registry, ballot):
+	prefs, problems = parse_ranking(registry, ballot)
+	if len(problems):
+		raise InvalidBallotException(problems[0]['message'], problems)
+	return tuple(prefs)
+
+def cand_list (names, cands):
+	return list(map(lambda cand: names[cand], cands))
+
+def cand_names (names, cands):
+	return ', '.join(cand_list(names, cands))
+
+# Turns votes counted in fixed point back into a number of votes, floats are left as they are
+def unscaled (votes, scale):
+	return votes if scale is None else votes / scale
+
+def named_votes (names, votes, scale = None):
+	return dict(map(lambda x: (names[x[0]], unscaled(x[1], scale)), votes.items()))
+
+def votes_text (names, votes, scale = None):
+	return ', '.join(map(lambda x: '%s: %s' % x, named_votes(names, votes, scale).items()))
+
+# Validates the tie breaker and turns it into the candidate ids from the most to the least preferred,
+# leaving out the ignored candidates
+def stv_tie_breaker (registry, tie_breaker, ignored_ids):
+	tie_breaker_list = registry.split_ranking(tie_breaker)
+	if len(set(tie_breaker_list)) != len(tie_breaker_list):
+		raise InvalidTieBreakerException('Duplicate candidates in tie breaker')
+	if len(tie_breaker_list) != len(registry):
+		raise InvalidTieBreakerException('Tie breaker vote must contain all candidates')
+	for pref in tie_breaker_list:
+		if not pref in registry:
+			raise InvalidTieBreakerException('Invalid candidate %s in tie breaker' % (pref))
+	return list(filter(lambda cand: cand not in ignored_ids, map(lambda pref: registry.ids[pref], tie_breaker_list)))
+
+# How many ballots rank each candidate at each position: positions[cand][k] is the amount of ballots with the
+# candidate as their preference number k + 1. Ballots can't be longer than the amount of candidates
+def position_matrix (ballot_groups, num_candidates):
+	positions = [ [ 0 ] * num_candidates for i in range(num_candidates) ]
+	for prefs, count in ballot_groups:
+		for k, cand in enumerate(prefs):
+			positions[cand][k] += count
+	return positions
+
+# The candidate least preferred by the tie breaker
+def least_preferred (tie_breaker, cands):
+	preferenceIndices = list(map(lambda cand: { 'cand': cand, 'index': tie_breaker.index(cand) }, cands))
+	return reduce(lambda a, b: a if a['index'] > b['index'] else b, preferenceIndices)['cand']
 
 # Ported from https://github.com/tejoesperanto/vocho-lib/blob/master/src/stv.js
-def STV (places, candidates, ballots, ignored_candidates = [], tie_breaker = None):
-	candidates = list(candidates)
-	places = min(places, len(candidates)) # We can't elect a ghost
+# With profile set the results also hold the time and memory spent on each phase and round of the count
+# Votes and ballot weights are floats, unless decimals is set: they're then integers counting units of
+# 10^-decimals votes, and transfer values and transferred votes are truncated to that many decimals, as most
+# STV rules do. Such counts are exact and the same on every platform, see count_stv
+def STV (places, candidates, ballots, ignored_candidates = [], tie_breaker = None, engine = 'piles', profile = False, decimals = None):
+	return run_profiled(profile, count_stv, places, candidates, ballots, ignored_candidates, tie_breaker, engine, decimals, None)
+
+# Counts the ballots of a LiveTally, which have already been validated
+def STVFromTally (places, tally, ignored_candidates = [], tie_breaker = None, engine = 'piles', profile = False, decimals = None):
+	return run_profiled(profile, count_stv, places, tally.candidates, None, ignored_candidates, tie_breaker, engine, decimals, tally)
+
+# Goes on with a count that needed a tie breaker, from the checkpoint of its TieBreakerNeededException. The count
+# continues with the very elimination that was tied, so nothing is validated, tallied or counted twice.
+# The count carries on in the checkpoint itself, which is why a checkpoint can only be resumed once
+def STVResume (checkpoint, tie_breaker, profile = False):
+	return run_profiled(profile, resume_stv, checkpoint, tie_breaker)
+
+# Counting in fixed point costs little, as the ballot weights stay in the ballots of the engine either way: 1 000 000
+# truncated ballots over 30 candidates for 5 places (python -m lib.bench -d 6) take ~13.4 s with 6 decimals against
+# ~11.2 s with floats, 100 000 such ballots ~1.32 s against ~1.28 s
+def count_stv (places, candidates, ballots, ignored_candidates, tie_breaker, engine, decimals, tally, profiler):
+	profiler.enter('validation')
+	if not engine in stv_engines:
+		raise ValueError('Unknown STV engine %s' % (engine))
+	if decimals is not None and decimals < 0:
+		raise ValueError('Can\'t count with %d decimals' % (decimals))
+	scale = None if decimals is None else 10 ** decimals
+	unit = 1 if scale is None else scale # The value of a ballot that hasn't been transferred yet
+
+	# From here on candidates are counted by their integer id, names are only used for messages and the results
+	registry = CandidateRegistry(candidates)
+	names = registry.names
+	candidates = list(range(len(registry)))
+
+	ignored_ids = set()
+	for cand in ignored_candidates:
+		if not cand in registry:
+			raise InvalidIgnoredCandidateException(cand)
+		ignored_ids.add(registry.ids[cand])
+	places = min(places, len(candidates) - len(ignored_ids)) # We can't elect a ghost, nor anyone ignored
 
 	# Validate the tie breaker
 	if tie_breaker is not None:
-		if len(set(tie_breaker)) != len(tie_breaker):
-			raise InvalidTieBreakerException('Duplicate candidates in tie breaker')
-		if len(tie_breaker) != len(candidates):
-			raise InvalidTieBreakerException('Tie breaker vote must contain all candidates')
-		for pref in tie_breaker:
-			if not pref in candidates:
-				raise InvalidTieBreakerException('Invalid candidate %s in tie breaker' % (pref))
-		for cand in ignored_candidates:
-			tie_breaker = tie_breaker.replace(cand, '')
-
-	original_ballots = list(ballots)
-	weighted_ballots = list(map(lambda b: { 'prefs': b, 'weight': 1 }, ballots))
-
-	quota = len(ballots) / (places + 1) # Hagenbach-Bischoff
-
-	blank_ballots = 0
-
-	# Validate the ballots
-	for i, ballot in enumerate(ballots):
-		if not len(ballot):
-			blank_ballots += 1
-			continue
-
-		already_mentioned = []
-		for pref in ballot:
-			if pref not in candidates:
-				raise InvalidBallotException('Invalid candidate %s in ballot %s' % (pref, ballot))
-			if pref in already_mentioned:
-				raise InvalidBallotException('Duplicate candidate %s in ballot %s' % (pref, ballot))
-			already_mentioned.append(pref)
-
-		for cand in ignored_candidates:
-			ballots[i] = ballot.replace(cand, '')
-
-	for cand in ignored_candidates:
-		candidates.remove(cand)
+		tie_breaker = stv_tie_breaker(registry, tie_breaker, ignored_ids)
+
+	traced = tracing() # Only build the trace events if anyone is listening
+
+	if tally is None:
+		ballot_groups = aggregate_ballots(ballots)
+		num_ballots = sum(map(lambda g: g[1], ballot_groups))
+		blank_ballots = 0
+
+		# Validate the ballots and turn them into sequences of candidate ids
+		original_ballots = []
+		for i, (ballot, count) in enumerate(ballot_groups):
+			if traced and not i % 10000:
+				trace('validating', done = i, total = len(ballot_groups))
+			prefs = stv_ballot_prefs(registry, ballot)
+			if not len(prefs):
+				blank_ballots += count
+			original_ballots.append((prefs, count))
+	else:
+		original_ballots = tally.ballot_groups()
+		num_ballots = tally.num_ballots
+		blank_ballots = tally.blank_ballots
+	ballot_groups = original_ballots
+
+	# Hagenbach-Bischoff
+	if scale is None:
+		quota = num_ballots / (places + 1)
+	else:
+		quota = num_ballots * scale // (places + 1)
+
+	profiler.enter('tally')
+	candidates = list(filter(lambda cand: cand not in ignored_ids, candidates))
+
+	# Strip the ignored candidates and merge the groups that become identical by doing so
+	if len(ignored_ids):
+		stripped_ballots = {}
+		for i, (ballot, count) in enumerate(ballot_groups):
+			tallying(i, ballot_groups)
+			ballot = tuple(filter(lambda cand: cand not in ignored_ids, ballot))
+			stripped_ballots[ballot] = stripped_ballots.get(ballot, 0) + count
+		ballot_groups = list(stripped_ballots.items())
+
+	weighted_ballots = stv_engines[engine](ballot_groups, unit)
 
 	# Check blank vote count
-	debug('%d ballots cast (%d blank)' % (len(ballots), blank_ballots))
-	if blank_ballots >= len(ballots) / 2:
-		raise TooManyBlankBallotsException('Too many blank ballots', blank_ballots, len(ballots))
+	debug('%d ballots cast (%d blank)', num_ballots, blank_ballots)
+	if blank_ballots >= num_ballots / 2:
+		raise TooManyBlankBallotsException('Too many blank ballots', blank_ballots, num_ballots)
 
-	debug('There are %d places and %d candidates' % (places, len(candidates)))
-	debug('Election quota: %.3f' % (quota))
-
-	elected_candidates = []
+	debug('There are %d places and %d candidates', places, len(candidates))
+	debug('Election quota: %.3f', unscaled(quota, scale))
+	if traced:
+		trace('start', places = places, candidates = cand_list(names, candidates), quota = unscaled(quota, scale))
 
 	# Determine the amount of votes each candidate has based on everyone's first preference
 	candidate_votes = {}
 	for cand in candidates:
 		candidate_votes[cand] = 0
-	for ballot in ballots:
-		try:
-			first_pref = ballot[0]
-			candidate_votes[first_pref] += 1
-		except IndexError:
-			pass
+	for ballot in weighted_ballots.ballots:
+		first_pref = weighted_ballots.head(ballot)
+		if first_pref is not None:
+			candidate_votes[first_pref] += ballot['count'] * unit
+
+	# Everything the rounds need, which is also the checkpoint the count is resumed from after a tie
+	state = {
+		'method': 'STV',
+		'registry': registry,
+		'ignored_ids': ignored_ids,
+		'places': places,
+		'quota': quota,
+		'scale': scale,
+		'num_ballots': num_ballots,
+		'blank_ballots': blank_ballots,
+		'original_ballots': original_ballots,
+		'weighted_ballots': weighted_ballots,
+		'candidates': candidates,
+		'candidate_votes': candidate_votes,
+		'elected_candidates': [],
+		'rounds_stats': [],
+		'stv_round': 0,
+		'positions': None, # See position_matrix, only needed once there's a tie
+		'tie': None, # The votes and candidates of the tied elimination that needs a tie breaker
+		'resumed': False
+	}
+	return count_rounds(state, tie_breaker, profiler)
+
+def resume_stv (checkpoint, tie_breaker, profiler):
+	profiler.enter('validation')
+	if checkpoint['resumed']:
+		raise ValueError('The count has already been resumed from this checkpoint')
+	if not tie_breaker:
+		raise InvalidTieBreakerException('Tie breaker vote must contain all candidates')
+	tie_breaker = stv_tie_breaker(checkpoint['registry'], tie_breaker, checkpoint['ignored_ids'])
+	checkpoint['resumed'] = True
+	return count_rounds(checkpoint, tie_breaker, profiler)
+
+def count_rounds (state, tie_breaker, profiler):
+	names = state['registry'].names
+	places = state['places']
+	quota = state['quota']
+	scale = state['scale']
+	original_ballots = state['original_ballots']
+	weighted_ballots = state['weighted_ballots']
+	candidates = state['candidates']
+	candidate_votes = state['candidate_votes']
+	elected_candidates = state['elected_candidates']
+	rounds_stats = state['rounds_stats']
+	traced = tracing()
+
+	def eliminate (eliminated_cand, min_votes, min_votes_cands, tie_broken):
+		stv_round = state['stv_round']
+
+		# Find all ballots that have the eliminated candidate as their first priority
+		eliminated_ballots = weighted_ballots.pile(eliminated_cand)
+
+		# Remove all mentions of the candidate from the ballots
+		weighted_ballots.exclude(eliminated_cand)
+
+		# Transfer the votes of the eliminated candidate to their next preference (if there is one)
+		transfer_to = {}
+		for ballot in eliminated_ballots:
+			next_pref = weighted_ballots.head(ballot)
+			if next_pref is None:
+				continue
+			candidate_votes[next_pref] += ballot['weight'] * ballot['count']
+			if traced:
+				transfer_to[next_pref] = transfer_to.get(next_pref, 0) + ballot['weight'] * ballot['count']
+
+		# Remove eliminated candidates from the list of candidates
+		candidates.remove(eliminated_cand)
+		del candidate_votes[eliminated_cand]
+		rounds_stats[-1]['eliminated'] = eliminated_cand
+
+		debug('Eliminated candidate: %s', names[eliminated_cand])
+		if traced:
+			trace('eliminated', round = stv_round, candidate = names[eliminated_cand], votes = unscaled(min_votes, scale),
+				tied = cand_list(names, min_votes_cands), tie_breaker = tie_broken)
+			trace('transfer', round = stv_round, candidate = names[eliminated_cand], to = named_votes(names, transfer_to, scale))
+
+	# A resumed count starts by breaking the tie it stopped at, finishing that round
+	if state['tie'] is not None:
+		profiler.round()
+		profiler.enter('tie_resolution')
+		min_votes, min_votes_cands, tied_cands = state['tie']
+		state['tie'] = None
+		eliminated_cand = least_preferred(tie_breaker, tied_cands)
+		profiler.enter('elimination')
+		eliminate(eliminated_cand, min_votes, min_votes_cands, True)
 
-	rounds_stats = []
-	stv_round = 0
 	while len(elected_candidates) < places:
-		debug('\nRound %d' % (stv_round + 1))
-		stv_round += 1
+		profiler.round()
+		profiler.enter('election')
+		stv_round = state['stv_round'] + 1
+		state['stv_round'] = stv_round
+		debug('\nRound %d', stv_round)
 		round_stat = {
 			'elected': set(),
 			'eliminated': None,
@@ -81,24 +356,22 @@ def STV (places, candidates, ballots, ignored_candidates = [], tie_breaker = Non
 		}
 		rounds_stats.append(round_stat)
 
-		debug('Valid candidates: %s' % (', '.join(candidates)))
+		debug('Valid candidates: %s', lazy(cand_names, names, candidates))
 
-		votes_debug = []
 		exceeds_quota = []
-		debug('Votes for each candidate:')
 		for cand, votes in candidate_votes.items():
 			round_stat['votes'][cand] = votes;
-			votes_debug.append('%s: %s' % (cand, votes))
 			if votes > quota:
 				exceeds_quota.append(cand)
-		debug(', '.join(votes_debug))
+		debug('Votes for each candidate:\n%s', lazy(votes_text, names, candidate_votes, scale))
+		if traced:
+			trace('round', round = stv_round, votes = named_votes(names, candidate_votes, scale))
 		for cand in exceeds_quota:
 			if cand not in elected_candidates:
 				elected_candidates.append(cand)
 		round_stat['elected'].update(exceeds_quota)
 
-		debug('Ballots:')
-		debug(weighted_ballots)
+		debug('Ballots:\n%s', weighted_ballots.ballots)
 
 		# §3.7: Check if the amount of remaining candidates is equal to the amount of remaining places, and if so elect all remaining candidates
 		if places - len(elected_candidates) == len(candidates):
@@ -107,149 +380,135 @@ def STV (places, candidates, ballots, ignored_candidates = [], tie_breaker = Non
 				if cand not in elected_candidates:
 					elected_candidates.append(cand)
 			round_stat['elected'].update(candidates)
-			debug('Elected all remaining candidates: %s' % (', '.join(candidates)))
+			debug('Elected all remaining candidates: %s', lazy(cand_names, names, candidates))
+			if traced:
+				trace('elected', round = stv_round, candidates = cand_list(names, candidates), reason = 'remaining')
 
 		if len(exceeds_quota):
-			debug('Elected candidates: %s' % (', '.join(exceeds_quota)))
+			debug('Elected candidates: %s', lazy(cand_names, names, exceeds_quota))
+			if traced:
+				trace('elected', round = stv_round, candidates = cand_list(names, exceeds_quota), reason = 'quota')
 		else:
 			debug('No candidates elected')
 
 		# Transfer surplus votes
 		# Calculate the surplus transfer value using the Gregory method
+		if len(exceeds_quota):
+			profiler.enter('surplus_transfer')
 		for cand in exceeds_quota:
 			votes_received = candidate_votes[cand]
 
 			# Find all ballots that listed the candidate as the first priority
-			first_pref_ballots = []
-			for ballot in weighted_ballots:
-				try:
-					if ballot['prefs'][0] == cand:
-						first_pref_ballots.append(ballot)
-				except IndexError:
-					pass
-
-			total_cand_vote_value = sum(map(lambda b: b['weight'], first_pref_ballots))
+			first_pref_ballots = weighted_ballots.pile(cand)
+
+			total_cand_vote_value = sum(map(lambda b: b['weight'] * b['count'], first_pref_ballots))
 			transfer_value_factor = (total_cand_vote_value - quota) / total_cand_vote_value
 
-			for ballot in first_pref_ballots:
-				# Change the weight of each relevant ballot
-				ballot['weight'] *= transfer_value_factor
+			# Change the weight of each relevant ballot
+			if scale is None:
+				for ballot in first_pref_ballots:
+					ballot['weight'] *= transfer_value_factor
+			else:
+				surplus = total_cand_vote_value - quota
+				for ballot in first_pref_ballots:
+					ballot['weight'] = ballot['weight'] * surplus // total_cand_vote_value
 
 			# Remove the elected candidate from the list of candidates
 			candidates.remove(cand)
 			del candidate_votes[cand]
 
 			# Remove all mentions of the candidate from the ballots
-			for ballot in weighted_ballots:
-				ballot['prefs'] = ballot['prefs'].replace(cand, '')
+			weighted_ballots.exclude(cand)
 
 			transfer_to = {}
 			for ballot in first_pref_ballots:
 				# Count the second priorities of all relevant ballots
-				next_pref = None
-				try:
-					next_pref = ballot['prefs'][0]
-				except IndexError:
+				next_pref = weighted_ballots.head(ballot)
+				if next_pref is None:
 					continue # Ignore the vote if there's no next priority
 
 				if not next_pref in transfer_to:
-					transfer_to[next_pref] = 1
+					transfer_to[next_pref] = ballot['count']
 				else:
-					transfer_to[next_pref] += 1;
+					transfer_to[next_pref] += ballot['count'];
 
 			# Transfer the votes
+			transferred = {}
 			for to, votes in transfer_to.items():
-				new_votes = (votes_received - quota) / votes_received * votes;
+				if scale is None:
+					new_votes = (votes_received - quota) / votes_received * votes;
+				else:
+					new_votes = (votes_received - quota) * votes * scale // votes_received
 				candidate_votes[to] += new_votes;
+				transferred[to] = new_votes
+
+			if traced:
+				trace('surplus_transfer', round = stv_round, candidate = names[cand], factor = transfer_value_factor,
+					to = named_votes(names, transferred, scale))
 
 		if not len(exceeds_quota): # No candidate elected, time to eliminate someone
+			profiler.enter('elimination')
 			# § 3.11, eliminate the candidate with the least votes
-			min_votes = sys.maxsize
+			min_votes = None
 			min_votes_cands = None
 			for cand, votes in candidate_votes.items():
-				if votes < min_votes:
+				if min_votes is None or votes < min_votes:
 					min_votes = votes
 					min_votes_cands = [ cand ]
 				elif votes == min_votes:
 					min_votes_cands.append(cand)
 
 			eliminated_cand = None
+			tie_broken = False
 			if len(min_votes_cands) == 1: # No tie
 				eliminated_cand = min_votes_cands[0]
 			else:
 				# § 3.11 If multiple candidates have the same amount of votes, eliminate the one with the least first priorities
 				# then second priorities etc. in the ORIGINAL ballots.
 				# If there is still equality, a tie breaker is needed, whose least preferred of the relevant candidates is to be eliminated
-				
-				priority_num = -1
-				while priority_num < len(candidates):
-					priority_num += 1
-
-					num_priorities = sys.maxsize
-					num_priorities_cands = None
-					for cand in min_votes_cands:
-						# Find all ballots with the candidate at this priority level
-						cand_num_priorities = 0
-						for ballot in original_ballots:
-							try:
-								if ballot[priority_num] != cand:
-									continue
-							except IndexError:
-								continue
-							cand_num_priorities += 1
-						if cand_num_priorities < num_priorities:
-							num_priorities = cand_num_priorities
-							num_priorities_cands = [ cand ]
-						else:
-							num_priorities_cands.append(cand)
+				# Comparing the candidates' rows of the position matrix does just that, with no need to go through the ballots
+				profiler.enter('tie_resolution')
+				if state['positions'] is None:
+					state['positions'] = position_matrix(original_ballots, len(names))
+				positions = state['positions']
+				least_positions = min(map(lambda cand: positions[cand], min_votes_cands))
+				tied_cands = list(filter(lambda cand: positions[cand] == least_positions, min_votes_cands))
 
 				# Check if we've found a candidate to eliminate
-				if len(min_votes_cands) == 1:
-					eliminated_cand = min_votes_cands[0]
+				if len(tied_cands) == 1:
+					eliminated_cand = tied_cands[0]
+					debug('Tie between %s resolved by the priorities in the original ballots', lazy(cand_names, names, min_votes_cands))
 				else:
 					# Nope, there's still equality. This calls for a tie breaker
+					# Without one the count stops here, and is resumed from this very elimination once it's known
 					if not tie_breaker:
-						raise TieBreakerNeededException()
+						state['tie'] = (min_votes, min_votes_cands, tied_cands)
+						raise TieBreakerNeededException(state)
 					# The least preferred candidate according to the tie breaker is eliminated
-					preferenceIndices = list(map(lambda cand: { 'cand': cand, 'index': tie_breaker.index(cand) },min_votes_cands))
-					eliminated_cand = reduce(lambda a, b: a if a['index'] > b['index'] else b, preferenceIndices)['cand']
-
-			# Transfer the votes of the eliminated candidate
-			for ballot in weighted_ballots:
-				# Find all ballots that have the eliminated candidate as their first priority
-				try:
-					if ballot['prefs'][0] != eliminated_cand:
-						continue
-				except IndexError:
-					continue
-				# Find their next preference (if there is one)
-				next_pref = None
-				try:
-					next_pref = ballot['prefs'][1]
-				except IndexError:
-					continue
-				candidate_votes[next_pref] += ballot['weight']
-
-			# Remove eliminated candidates from the list of candidates
-			candidates.remove(eliminated_cand)
-			del candidate_votes[eliminated_cand]
-			round_stat['eliminated'] = eliminated_cand
-
-			# Remove all mentions of the candidate from the ballots
-			for ballot in weighted_ballots:
-				ballot['prefs'] = ballot['prefs'].replace(eliminated_cand, '')
-
-			debug('Eliminated candidate: %s' % (eliminated_cand))
-
-	debug('\n\nDone!\nElected: %s' % (', '.join(elected_candidates)))
-
-	debug('Remaining ballots:')
-	debug(weighted_ballots)
+					eliminated_cand = least_preferred(tie_breaker, tied_cands)
+					tie_broken = True
+				profiler.enter('elimination')
+
+			eliminate(eliminated_cand, min_votes, min_votes_cands, tie_broken)
+
+	profiler.end_round()
+	profiler.enter('results')
+	debug('\n\nDone!\nElected: %s', lazy(cand_names, names, elected_candidates))
+	debug('Remaining ballots:\n%s', weighted_ballots.ballots)
+	if traced:
+		trace('done', winners = cand_list(names, elected_candidates), rounds = state['stv_round'])
+
+	# Map the candidate ids back to their names
+	for round_stat in rounds_stats:
+		round_stat['elected'] = set(map(lambda cand: names[cand], round_stat['elected']))
+		if round_stat['eliminated'] is not None:
+			round_stat['eliminated'] = names[round_stat['eliminated']]
+		round_stat['votes'] = named_votes(names, round_stat['votes'], scale)
 
 	return {
-		'ballots': len(ballots),
-		'blank_ballots': blank_ballots,
-		'winners': elected_candidates,
+		'ballots': state['num_ballots'],
+		'blank_ballots': state['blank_ballots'],
+		'winners': list(map(lambda cand: names[cand], elected_candidates)),
 		'rounds': rounds_stats,
-		'quota': quota
+		'quota': unscaled(quota, scale)
 	}
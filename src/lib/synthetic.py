@@ -0,0 +1,99 @@
+import random
+from bisect import bisect
+from itertools import accumulate
+
+# Synthetic electorates for benchmarking. Every generator is driven by a random.Random, so the same seed
+# always gives the same election, and yields ballots in the same format as typed into the GUI
+
+def candidate_names (num_candidates):
+	if num_candidates <= 26:
+		return list(map(lambda i: chr(ord('A') + i), range(num_candidates)))
+	return list(map(lambda i: 'K%d' % (i + 1), range(num_candidates)))
+
+# Every ranking is equally likely
+def impartial_sampler (rng, candidates):
+	return lambda: rng.sample(candidates, len(candidates))
+
+# Rankings scattered around a reference ranking (the Mallows model, sampled by repeated insertion)
+# The smaller the dispersion (0 to 1) the closer the rankings are to the reference, 1 is the same as impartial
+def mallows_sampler (rng, reference, dispersion = 0.5):
+	# Inserting the i-th candidate of the reference at position j creates i - j inversions
+	cum_weights = []
+	for i in range(len(reference)):
+		cum_weights.append(list(accumulate(map(lambda j: dispersion ** (i - j), range(i + 1)))))
+
+	def sample ():
+		ranking = []
+		for cand, weights in zip(reference, cum_weights):
+			ranking.insert(bisect(weights, rng.random() * weights[-1]), cand)
+		return ranking
+	return sample
+
+# Voters split into blocs, each scattered around its own reference ranking
+def polarized_sampler (rng, candidates, blocs = 2, dispersion = 0.3):
+	samplers = list(map(lambda i: mallows_sampler(rng, rng.sample(candidates, len(candidates)), dispersion), range(blocs)))
+	return lambda: samplers[rng.randrange(blocs)]()
+
+def ranking_ballot (ranking):
+	return '>'.join(ranking)
+
+# Voters only rank a random amount of their preferred candidates
+def truncated_ballot (rng, ranking):
+	return '>'.join(ranking[:rng.randint(1, len(ranking))])
+
+# Adjacent candidates are ranked equally with the given probability, which is only understood by RP
+def tied_ballot (rng, ranking, tie_share = 0.5):
+	ballot = ranking[0]
+	for cand in ranking[1:]:
+		ballot += ('=' if rng.random() < tie_share else '>') + cand
+	return ballot
+
+def impartial_election (rng, candidates, num_ballots):
+	sample = impartial_sampler(rng, candidates)
+	for i in range(num_ballots):
+		yield ranking_ballot(sample())
+
+def mallows_election (rng, candidates, num_ballots):
+	sample = mallows_sampler(rng, rng.sample(candidates, len(candidates)))
+	for i in range(num_ballots):
+		yield ranking_ballot(sample())
+
+def polarized_election (rng, candidates, num_ballots):
+	sample = polarized_sampler(rng, candidates)
+	for i in range(num_ballots):
+		yield ranking_ballot(sample())
+
+def truncated_election (rng, candidates, num_ballots):
+	sample = mallows_sampler(rng, rng.sample(candidates, len(candidates)))
+	for i in range(num_ballots):
+		yield truncated_ballot(rng, sample())
+
+def blanks_election (rng, candidates, num_ballots, blank_share = 0.2):
+	sample = mallows_sampler(rng, rng.sample(candidates, len(candidates)))
+	for i in range(num_ballots):
+		yield '' if rng.random() < blank_share else ranking_ballot(sample())
+
+def ties_election (rng, candidates, num_ballots):
+	sample = impartial_sampler(rng, candidates)
+	for i in range(num_ballots):
+		yield tied_ballot(rng, sample())
+
+electorate_models = {
+	'impartial': impartial_election,
+	'mallows': mallows_election,
+	'polarized': polarized_election,
+	'truncated': truncated_election,
+	'blanks': blanks_election,
+	'ties': ties_election
+}
+
+# Models that use equal preferences, which only RP can count
+rp_only_models = { 'ties' }
+
+# Returns the candidates and the list of ballots of a reproducible synthetic election
+def generate_election (model, num_ballots, num_candidates, seed = 0):
+	if not model in electorate_models:
+		raise ValueError('Unknown electorate model %s' % (model))
+	rng = random.Random('%s-%d-%d-%d' % (model, num_ballots, num_candidates, seed))
+	candidates = candidate_names(num_candidates)
+	return candidates, list(electorate_models[model](rng, candidates, num_ballots))
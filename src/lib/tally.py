@@ -0,0 +1,120 @@
+from collections import Counter
+
+from lib.exceptions import InvalidBallotException
+from lib.ballots import CandidateRegistry, normalize_ballot
+from lib.pairwise import pairwise_matrix, rp_ballot_ranks
+from lib.stv import stv_ballot_prefs
+
+# The tally of ballots that are still being entered, kept up to date line by line as the ballots are edited so
+# that the count itself only has to run the elimination (STV) or ranking and locking (RP) phase, see STVFromTally
+# and RankedPairsFromTally. Every method but STV counts from the same pairwise matrix. Each distinct ballot is
+# validated once, when its first line appears, and invalid ballots are kept aside so that they can be pointed out
+# right away.
+# The tally depends on the method and the candidates, a new one is needed whenever they change
+class LiveTally:
+	def __init__ (self, method, candidates, lines = []):
+		self.method = method
+		self.candidates = list(candidates)
+		# The candidate ids must match those of the engine
+		if method != 'STV':
+			self.registry = CandidateRegistry(sorted(self.candidates))
+		else:
+			self.registry = CandidateRegistry(self.candidates)
+		num_candidates = len(self.registry)
+
+		self.lines = [] # The normalized ballot of each line, None for empty lines
+		self.counts = {} # The amount of lines with each ballot
+		self.parsed = {} # The candidate ids (STV) or rank vector (other methods) of each ballot, or why it's invalid
+		self.num_ballots = 0
+		self.blank_ballots = 0
+		self.invalid_ballots = 0
+		self.first_preferences = [ 0 ] * num_candidates
+		self.mentions = [ 0 ] * num_candidates
+		self.matrix = [ [ 0 ] * num_candidates for i in range(num_candidates) ]
+
+		self.replace_lines(0, 0, lines)
+
+	def parse (self, ballot):
+		try:
+			if self.method != 'STV':
+				return rp_ballot_ranks(self.registry, ballot)
+			return stv_ballot_prefs(self.registry, ballot)
+		except InvalidBallotException as e:
+			return e
+
+	# Replaces the lines start up to end with new_lines, which may be of any length
+	def replace_lines (self, start, end, new_lines):
+		changes = Counter()
+		for ballot in self.lines[start:end]:
+			if ballot is not None:
+				changes[ballot] -= 1
+		new_lines = list(map(normalize_ballot, new_lines))
+		for ballot in new_lines:
+			if ballot is not None:
+				changes[ballot] += 1
+		self.lines[start:end] = new_lines
+
+		rank_vectors = []
+		rank_counts = []
+		for ballot, change in changes.items():
+			if not change:
+				continue
+			if not ballot in self.parsed:
+				self.parsed[ballot] = self.parse(ballot)
+			parsed = self.parsed[ballot]
+
+			count = self.counts.get(ballot, 0) + change
+			if count:
+				self.counts[ballot] = count
+			else:
+				del self.counts[ballot]
+				del self.parsed[ballot]
+
+			if isinstance(parsed, InvalidBallotException):
+				self.invalid_ballots += change
+				continue
+			self.num_ballots += change
+
+			if self.method != 'STV':
+				if parsed is None:
+					self.blank_ballots += change
+					continue
+				ranks, mentioned = parsed
+				for cand in mentioned:
+					self.mentions[cand] += change
+				rank_vectors.append(ranks)
+				rank_counts.append(change)
+			else:
+				if not len(parsed):
+					self.blank_ballots += change
+					continue
+				self.first_preferences[parsed[0]] += change
+
+		# Removed ballots simply weigh negatively
+		if len(rank_vectors):
+			changed_matrix = pairwise_matrix(rank_vectors, rank_counts, len(self.registry))
+			for row, changed_row in zip(self.matrix, changed_matrix):
+				for j, change in enumerate(changed_row):
+					row[j] += change
+
+	# The valid ballots as (candidate ids, count) groups in the order they first appear, like STV makes them
+	def ballot_groups (self):
+		groups = []
+		for ballot in dict.fromkeys(self.lines):
+			if ballot is None or isinstance(self.parsed[ballot], InvalidBallotException):
+				continue
+			groups.append((self.parsed[ballot], self.counts[ballot]))
+		return groups
+
+	# The line numbers (counting from 0) of the invalid ballots, along with all of their problems
+	def invalid_lines (self, limit = None):
+		invalid = []
+		if not self.invalid_ballots:
+			return invalid
+		for i, ballot in enumerate(self.lines):
+			if ballot is None or not isinstance(self.parsed[ballot], InvalidBallotException):
+				continue
+			invalid.append((i, self.parsed[ballot].problems))
+			if limit is not None and len(invalid) == limit:
+				break
+		return invalid
@@ -0,0 +1,40 @@
+# The texts the GUI shows about counts and ballots, in Esperanto. They're kept apart from the GUI so that anything
+# else showing the same results can use them without Qt
+
+profile_phase_names = {
+	'validation': 'Kontrolado',
+	'tally': 'Nombrado',
+	'election': 'Elektado',
+	'surplus_transfer': 'Transdonado de superfluaĵoj',
+	'elimination': 'Eliminado',
+	'tie_resolution': 'Egalecrompado',
+	'pairs': 'Komparado de paroj',
+	'ordering': 'Ordigado de paroj',
+	'locking': 'Ŝlosado',
+	'paths': 'Serĉado de la plej fortaj vojoj',
+	'results': 'Rezultoj'
+}
+
+def profile_text (profile):
+	text  = 'Tempo: %.3f s\n' % (profile['time'])
+	text += 'Plej granda memoruzo: %.1f MB\n' % (profile['peak_memory'] / 1e6)
+	text += '\nFazoj:\n'
+	for phase, stats in profile['phases'].items():
+		text += '%s: %.3f s, %d-foje, %.1f MB\n' % (profile_phase_names.get(phase, phase), stats['time'], stats['calls'], stats['peak_memory'] / 1e6)
+	if 'rounds' in profile:
+		text += '\nVicoj:\n'
+		for i, stv_round in enumerate(profile['rounds']):
+			text += '%d-a vico: %.3f s, %.1f MB\n' % (i + 1, stv_round['time'], stv_round['peak_memory'] / 1e6)
+	return text
+
+def problem_text (problem):
+	if problem['kind'] == 'unknown_candidate':
+		return 'nekonata kandidato %s' % (problem['candidate'])
+	elif problem['kind'] == 'duplicate_candidate':
+		return 'ripetita kandidato %s' % (problem['candidate'])
+	elif problem['kind'] == 'empty_preference':
+		return 'malplena prefero'
+	return 'egalaj preferoj ne eblas'
+
+def problems_text (problems):
+	return ', '.join(map(problem_text, problems))
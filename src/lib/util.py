@@ -1,4 +1,85 @@
-DEBUG=True
-def debug (msg):
-	if DEBUG:
-		print(msg)
+import json
+import logging
+
+# Messages go through the standard logging module under the 'vocho' logger and are only formatted when their level
+# is enabled, e.g. logging.basicConfig(level = logging.DEBUG, format = '%(message)s') shows the full count.
+# Structured events of the count (elected, eliminated, transfers etc.) are delivered to the trace sinks, any callable
+# taking a dict. With neither enabled, both cost a single check.
+logger = logging.getLogger('vocho')
+
+trace_sinks = []
+
+def debug (msg, *args):
+	if logger.isEnabledFor(logging.DEBUG):
+		logger.debug(msg, *args)
+
+def info (msg, *args):
+	if logger.isEnabledFor(logging.INFO):
+		logger.info(msg, *args)
+
+def debugging ():
+	return logger.isEnabledFor(logging.DEBUG)
+
+# An argument for a log message that's only computed if the message is actually formatted
+class lazy:
+	def __init__ (self, func, *args):
+		self.func = func
+		self.args = args
+
+	def __str__ (self):
+		return str(self.func(*self.args))
+
+# NumPy is optional and takes longer to import than the rest of Voĉo together, so it's only imported once a count
+# needs it rather than whenever the engines are: the module, or None if it isn't installed
+numpy_module = False
+
+def optional_numpy ():
+	global numpy_module
+	if numpy_module is False:
+		try:
+			import numpy
+			numpy_module = numpy
+		except ImportError:
+			numpy_module = None
+	return numpy_module
+
+# The commit being run, for reports that are compared across commits, or None outside of a git checkout
+def git_commit ():
+	import subprocess
+	try:
+		return subprocess.run([ 'git', 'rev-parse', 'HEAD' ], capture_output = True, text = True, check = True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def add_trace_sink (sink):
+	trace_sinks.append(sink)
+
+def remove_trace_sink (sink):
+	trace_sinks.remove(sink)
+
+def tracing ():
+	return len(trace_sinks) > 0
+
+def trace (event, **fields):
+	if not len(trace_sinks):
+		return
+	fields['event'] = event
+	for sink in trace_sinks:
+		sink(fields)
+
+# Collects all events in a list, e.g. to hand a full trace to an auditor
+class ListSink:
+	def __init__ (self):
+		self.events = []
+
+	def __call__ (self, event):
+		self.events.append(event)
+
+# Writes each event as a line of JSON
+class JSONLinesSink:
+	def __init__ (self, f):
+		self.f = f
+
+	def __call__ (self, event):
+		self.f.write(json.dumps(event, ensure_ascii = False, default = sorted))
+		self.f.write('\n')
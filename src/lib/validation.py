@@ -0,0 +1,134 @@
+from collections import Counter
+
+from lib.exceptions import InvalidBallotException
+from lib.ballots import CandidateRegistry, normalize_ballot
+
+# Every problem a ballot can have. Each problem found is a dict with its kind, the candidate concerned (if any)
+# and a message, validate_ballots also adds the line and the ballot
+problem_kinds = ('unknown_candidate', 'duplicate_candidate', 'empty_preference', 'equal_preferences')
+
+def ballot_problem (kind, ballot, candidate = None):
+	if kind == 'unknown_candidate':
+		message = 'Invalid candidate %s in ballot %s' % (candidate, ballot)
+	elif kind == 'duplicate_candidate':
+		message = 'Duplicate candidate %s in ballot %s' % (candidate, ballot)
+	elif kind == 'empty_preference':
+		message = 'Empty preference in ballot %s' % (ballot)
+	else:
+		message = 'Equal preferences are not allowed in ballot %s' % (ballot)
+	return { 'kind': kind, 'candidate': candidate, 'message': message }
+
+# Splits a ranking without equal preferences, such as an STV ballot, into its candidate ids and finds all of its
+# problems at once. Preferences are separated by >, or not at all if every candidate name is a single character,
+# e.g. A>B>C or ABC. A blank ballot has no preferences
+def parse_ranking (registry, ballot):
+	prefs = []
+	problems = []
+	if not len(ballot):
+		return prefs, problems
+
+	if '=' in ballot:
+		problems.append(ballot_problem('equal_preferences', ballot))
+		ballot = ballot.replace('=', '>')
+	names = ballot if registry.single_character and not '>' in ballot else ballot.split('>')
+
+	ids = registry.ids
+	mentioned = 0 # A bit per candidate id
+	empty = False
+	for name in names:
+		cand = ids.get(name)
+		if cand is None:
+			if not len(name):
+				empty = True
+			else:
+				problems.append(ballot_problem('unknown_candidate', ballot, name))
+			continue
+		bit = 1 << cand
+		if mentioned & bit:
+			problems.append(ballot_problem('duplicate_candidate', ballot, name))
+			continue
+		mentioned |= bit
+		prefs.append(cand)
+	if empty:
+		problems.append(ballot_problem('empty_preference', ballot))
+
+	return prefs, problems
+
+# Splits a ranking with equal preferences, such as A>B=C>D, into its rows of equally preferred candidate ids,
+# [[A], [B, C], [D]], and finds all of its problems at once. A blank ballot has no rows
+def parse_rows (registry, ballot):
+	rows = []
+	problems = []
+	if not len(ballot):
+		return rows, problems
+
+	ids = registry.ids
+	mentioned = 0 # A bit per candidate id
+	empty = False
+	for names in ballot.split('>'):
+		row = []
+		for name in names.split('='):
+			cand = ids.get(name)
+			if cand is None:
+				if not len(name):
+					empty = True
+				else:
+					problems.append(ballot_problem('unknown_candidate', ballot, name))
+				continue
+			bit = 1 << cand
+			if mentioned & bit:
+				problems.append(ballot_problem('duplicate_candidate', ballot, name))
+				continue
+			mentioned |= bit
+			row.append(cand)
+		if len(row):
+			rows.append(row)
+	if empty:
+		problems.append(ballot_problem('empty_preference', ballot))
+
+	return rows, problems
+
+# Normalizes the ballots one line at a time, see normalize_ballots, adding every problem found to problems along
+# with its line (counting from 1). Each distinct ballot is only checked once
+def validated_ballots (method, candidates, lines, problems):
+	registry = CandidateRegistry(candidates)
+	parse = parse_ranking if method == 'STV' else parse_rows
+	checked = {}
+	for i, line in enumerate(lines):
+		ballot = normalize_ballot(line)
+		if ballot is None:
+			continue
+		if not ballot in checked:
+			checked[ballot] = parse(registry, ballot)[1]
+		for problem in checked[ballot]:
+			problem = dict(problem)
+			problem['line'] = i + 1
+			problem['ballot'] = ballot
+			problems.append(problem)
+		yield ballot
+
+# Validates all ballots in a single pass, e.g. before counting, and returns every problem found along with its line
+def validate_ballots (method, candidates, lines):
+	problems = []
+	for ballot in validated_ballots(method, candidates, lines, problems):
+		pass
+	return problems
+
+# Raises an InvalidBallotException carrying every problem if there are any
+def raise_ballot_problems (problems):
+	if len(problems):
+		lines_with_problems = len(set(map(lambda problem: problem['line'], problems)))
+		raise InvalidBallotException('%d invalid ballots' % (lines_with_problems), problems)
+
+# Raises an InvalidBallotException carrying every problem if any ballot is invalid
+def check_ballots (method, candidates, lines):
+	raise_ballot_problems(validate_ballots(method, candidates, lines))
+
+# Validates and aggregates the ballots in the same pass, so that a file of ballots can be streamed in and counted
+# without ever holding its lines in memory. Returns the count of each distinct ballot, which the engines take as
+# already aggregated (see aggregate_ballots), or raises an InvalidBallotException carrying every problem
+def check_aggregate_ballots (method, candidates, lines):
+	problems = []
+	ballots = Counter(validated_ballots(method, candidates, lines, problems))
+	raise_ballot_problems(problems)
+	return ballots
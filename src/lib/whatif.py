@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Counts an election under many scenarios of ignored candidates, e.g. what if B withdraws, or both B and C, e.g.
+#   python -m lib.whatif STV -c A,B,C,D -p 2 ballots.txt -s B -s B,C
+#   python -m lib.whatif RP -c A,B,C,D --each -j 4 < ballots.txt
+# The ballots are validated and tallied only once, every scenario then only runs the count itself: STV strips the
+# ignored candidates from the already parsed distinct ballots and RP leaves them out of the pairwise matrix
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from lib.election import election_methods, count_tally, jsonable
+from lib.ballots import parse_candidates
+from lib.tally import LiveTally
+from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, InvalidIgnoredCandidateException, NoEligibleCandidatesException, TooManyBlankBallotsException, TieBreakerNeededException
+
+# The tally of an election, with the same interface as a LiveTally, that only keeps what the counts need
+class TalliedElection:
+	def __init__ (self, method, candidates, lines):
+		tally = LiveTally(method, candidates, lines)
+		if tally.invalid_ballots:
+			problems = []
+			invalid_lines = tally.invalid_lines()
+			for i, line_problems in invalid_lines:
+				for problem in line_problems:
+					problem = dict(problem)
+					problem['line'] = i + 1
+					problem['ballot'] = tally.lines[i]
+					problems.append(problem)
+			raise InvalidBallotException('%d invalid ballots' % (len(invalid_lines)), problems)
+
+		self.method = method
+		self.candidates = tally.candidates
+		self.num_ballots = tally.num_ballots
+		self.blank_ballots = tally.blank_ballots
+		if method == 'STV':
+			self.groups = tally.ballot_groups()
+		else:
+			self.matrix = tally.matrix
+			self.mentions = tally.mentions
+
+	def ballot_groups (self):
+		return self.groups
+
+	# Counts one scenario, turning the expected failures into an error entry
+	def count_scenario (self, ignored_candidates, places = 1, tie_breaker = None):
+		scenario = { 'ignored': list(ignored_candidates) }
+		try:
+			scenario['results'] = count_tally(self.method, self, ignored_candidates, places, tie_breaker)
+		except (TooManyBlankBallotsException, TieBreakerNeededException, NoEligibleCandidatesException) as e:
+			scenario['error'] = type(e).__name__
+		return scenario
+
+# Set in each worker process by init_worker, so that the tally only has to be sent once
+worker_election = None
+
+def init_worker (election, places, tie_breaker):
+	global worker_election
+	worker_election = (election, places, tie_breaker)
+
+def count_worker_scenario (ignored_candidates):
+	election, places, tie_breaker = worker_election
+	return election.count_scenario(ignored_candidates, places, tie_breaker)
+
+# Counts the election once per set of ignored candidates, in a pool of worker processes if workers isn't 1
+# The scenarios come back in the same order, each with its results or the error it ran into
+def evaluate_scenarios (method, candidates, lines, ignored_sets, places = 1, tie_breaker = None, workers = 1):
+	election = TalliedElection(method, candidates, lines)
+	for ignored_candidates in ignored_sets:
+		for cand in ignored_candidates:
+			if not cand in candidates:
+				raise InvalidIgnoredCandidateException(cand)
+
+	if workers == 1:
+		return list(map(lambda ignored_candidates: election.count_scenario(ignored_candidates, places, tie_breaker), ignored_sets))
+	with ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (election, places, tie_breaker)) as executor:
+		return list(executor.map(count_worker_scenario, ignored_sets))
+
+# The scenario without anyone ignored, followed by every candidate withdrawing on their own
+def single_withdrawals (candidates):
+	return [ [] ] + list(map(lambda cand: [ cand ], candidates))
+
+def main (argv = None):
+	parser = argparse.ArgumentParser(prog = 'python -m lib.whatif', description = 'Count an election under many scenarios of ignored candidates')
+	parser.add_argument('method', type = str.upper, choices = election_methods)
+	parser.add_argument('ballots', nargs = '?', default = '-', help = 'file to read the ballots from, - (default) for stdin')
+	parser.add_argument('-c', '--candidates', required = True, help = 'the candidates separated by commas')
+	parser.add_argument('-s', '--scenario', action = 'append', default = [], help = 'candidates to ignore separated by commas, may be repeated')
+	parser.add_argument('--each', action = 'store_true', help = 'add the scenarios of no one and of every single candidate being ignored')
+	parser.add_argument('-p', '--places', type = int, default = 1)
+	parser.add_argument('-t', '--tie-breaker', help = 'the tie breaker ballot, e.g. A>B>D>C for RP or ABDC for STV')
+	parser.add_argument('-j', '--jobs', type = int, default = 1, help = 'amount of worker processes (default: 1)')
+	args = parser.parse_intermixed_args(argv)
+
+	candidates = parse_candidates(args.candidates)
+	ignored_sets = list(map(parse_candidates, args.scenario))
+	if args.each:
+		ignored_sets += single_withdrawals(candidates)
+	if not len(ignored_sets):
+		parser.error('no scenarios given, use --scenario or --each')
+
+	ballots_file = sys.stdin if args.ballots == '-' else open(args.ballots, encoding = 'utf8')
+	try:
+		scenarios = evaluate_scenarios(args.method, candidates, list(ballots_file), ignored_sets, args.places, args.tie_breaker, args.jobs)
+	except (InvalidTieBreakerException, InvalidBallotException, ValueError) as e:
+		print(e, file = sys.stderr)
+		for problem in getattr(e, 'problems', []):
+			print('line %d: %s' % (problem['line'], problem['message']), file = sys.stderr)
+		return 1
+	finally:
+		if ballots_file is not sys.stdin:
+			ballots_file.close()
+
+	json.dump(jsonable({ 'scenarios': scenarios }), sys.stdout, ensure_ascii = False, indent = '\t')
+	print()
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
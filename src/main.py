@@ -2,29 +2,61 @@
 
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
 QHBoxLayout, QLabel, QComboBox, QPushButton, QLineEdit, QSpinBox,
-QPlainTextEdit, QMessageBox, QInputDialog, QAction)
-from PyQt5 import QtCore
+QPlainTextEdit, QTextEdit, QMessageBox, QInputDialog, QAction, QCheckBox, QProgressDialog,
+QDialog, QDialogButtonBox, QTabWidget, QTableView, QHeaderView, QFileDialog)
+from PyQt5 import QtCore, QtGui
 from collections import OrderedDict
-import re
 import sys
 import os
+import logging
+import traceback
 
-from lib.ranked_pairs import RankedPairs
-from lib.stv import STV
-from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, TooManyBlankBallotsException, TieBreakerNeededException
+from lib import util
+from lib.ballots import parse_candidates
+from lib.tally import LiveTally
+from lib.texts import profile_text, problems_text
+from lib.exceptions import InvalidTieBreakerException, InvalidBallotException, InvalidIgnoredCandidateException, NoEligibleCandidatesException, TooManyBlankBallotsException, TieBreakerNeededException, CountCancelledException
 
 try:
 	base_path = sys._MEIPASS
 except Exception:
 	base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
+# The full count is only printed to the console on request, e.g. VOCHO_DEBUG=1 python3 main.py
+if os.environ.get('VOCHO_DEBUG'):
+	logging.basicConfig(level = logging.DEBUG, format = '%(message)s')
+
+# Counting the same election again returns the results of the previous count, which are also kept on disk
+# with e.g. VOCHO_CACHE=~/.cache/vocho python3 main.py
+# Only what the window needs is imported at startup: the cache and the results view are imported by the first
+# count, and NumPy once a count needs it
+result_cache = None
+
+def get_result_cache ():
+	global result_cache
+	if result_cache is None:
+		from lib.cache import ResultCache
+		result_cache = ResultCache(path = os.environ.get('VOCHO_CACHE'))
+	return result_cache
+
 current_election_type = None
 election_types = OrderedDict(sorted({ 'RP': 'Paroranga metodo', 'STV': 'Unuopa Transdonebla Voĉo' }.items(), key=lambda x: x[0]))
+# The other Condorcet methods come after, as they're only there to compare RP with
+election_types.update([
+	('SCHULZE', 'Metodo de Schulze'),
+	('COPELAND', 'Metodo de Copeland'),
+	('MINIMAX', 'Minimaksa metodo')
+])
 
 def change_election_type (index):
 	global current_election_type
+	previous_election_type = current_election_type
 	current_election_type = list(election_types.items())[index][0]
-	places_input.setReadOnly(current_election_type != 'STV')
+	# Every method but STV counts from the same pairwise tally, which can be kept as it is
+	if ballots_tally is not None and previous_election_type is not None and not 'STV' in (previous_election_type, current_election_type):
+		ballots_tally.method = current_election_type
+		return
+	rebuild_tally()
 
 def reset_form ():
 	candidates_input.setText('')
@@ -32,147 +64,347 @@ def reset_form ():
 	places_input.setValue(1)
 	ballots_input.setPlainText('')
 
-comma_regex = r'[^,\s]'
-newline_regex = r'\r?\n'
-space_regex = r'\s'
+# Counts an election on its own thread so that the window stays responsive, reporting the progress of the count
+# as told by its trace events
+class CountWorker (QtCore.QThread):
+	progress = QtCore.pyqtSignal(str)
+	counted = QtCore.pyqtSignal(object)
+	failed = QtCore.pyqtSignal(object)
+
+	def __init__ (self, count):
+		super().__init__()
+		self.count = count
+		self.cancelled = False
+		self.locked_pairs = 0
+
+	def run (self):
+		util.add_trace_sink(self.trace)
+		try:
+			results = self.count()
+		except Exception as e:
+			self.failed.emit(e)
+			return
+		finally:
+			util.remove_trace_sink(self.trace)
+		self.counted.emit(results)
+
+	def cancel (self):
+		self.cancelled = True
+
+	# Called on the counting thread, which is also where a cancelled count is stopped
+	def trace (self, event):
+		if self.cancelled:
+			raise CountCancelledException()
+
+		if event['event'] == 'validating':
+			text = 'Kontrolado de balotiloj: %d el %d' % (event['done'], event['total'])
+		elif event['event'] == 'tallying':
+			text = 'Nombrado de balotiloj: %d %%' % (100 * event['done'] // event['total'])
+		elif event['event'] == 'round':
+			text = 'Kalkulado de la %d-a vico' % (event['round'])
+		elif event['event'] == 'place':
+			self.locked_pairs = 0
+			text = 'Serĉado de la %d-a venkinto' % (event['place'])
+		elif event['event'] == 'locked':
+			self.locked_pairs += 1
+			text = 'Ŝlositaj paroj: %d' % (self.locked_pairs)
+		else:
+			return
+		self.progress.emit(text)
+
+count_worker = None
+
+# The ballots are tallied as they are entered, see LiveTally
+ballots_tally = None
+tally_paused = False
+tally_outdated = False
+
+# Tallies all ballots anew, which is needed whenever the method or the candidates change
+def rebuild_tally ():
+	global ballots_tally, tally_outdated
+	if tally_paused:
+		tally_outdated = True
+		return
+	tally_outdated = False
+	ballots_tally = LiveTally(current_election_type, parse_candidates(candidates_input.text()), ballots_input.toPlainText().split('\n'))
+	update_tally_status()
+
+# Only the lines touched by an edit are tallied again
+def ballots_changed (position, chars_removed, chars_added):
+	if tally_paused or ballots_tally is None:
+		return
+	document = ballots_input.document()
+	block = document.findBlock(position)
+	first = block.blockNumber()
+	last = document.findBlock(min(position + chars_added, document.characterCount() - 1)).blockNumber()
+	removed_last = last - (document.blockCount() - len(ballots_tally.lines))
+
+	lines = []
+	for i in range(first, last + 1):
+		lines.append(block.text())
+		block = block.next()
+	ballots_tally.replace_lines(first, removed_last + 1, lines)
+	update_tally_status()
+
+def update_tally_status ():
+	text = '%d balotiloj, %d blankaj' % (ballots_tally.num_ballots, ballots_tally.blank_ballots)
+	invalid_lines = ballots_tally.invalid_lines(limit = 1000)
+	if len(invalid_lines):
+		text += ', %d nevalidaj (unua en linio %d)' % (ballots_tally.invalid_ballots, invalid_lines[0][0] + 1)
+	tally_label.setText(text)
+
+	# The window has a fixed size, so the first preferences are shown on hover
+	first_preferences_text = ''
+	if ballots_tally.method == 'STV' and ballots_tally.num_ballots > ballots_tally.blank_ballots:
+		first_preferences = zip(ballots_tally.registry.names, ballots_tally.first_preferences)
+		first_preferences_text = 'Unuaj preferoj: %s' % (', '.join(map(lambda x: '%s: %d' % x, first_preferences)))
+	tally_label.setToolTip(first_preferences_text)
+
+	# Mark the invalid lines
+	selections = []
+	document = ballots_input.document()
+	for line, problems in invalid_lines:
+		selection = QTextEdit.ExtraSelection()
+		selection.format.setBackground(QtGui.QColor(255, 200, 200))
+		selection.format.setProperty(QtGui.QTextFormat.FullWidthSelection, True)
+		selection.format.setToolTip(problems_text(problems))
+		selection.cursor = QtGui.QTextCursor(document.findBlockByNumber(line))
+		selections.append(selection)
+	ballots_input.setExtraSelections(selections)
+
 def run_election ():
-	candidates = re.findall(comma_regex, candidates_input.text())
-	ignored_candidates = re.findall(comma_regex, ignored_candidates_input.text())
+	global tally_paused
+
+	tally = ballots_tally
+	candidates = tally.candidates
+	ignored_candidates = parse_candidates(ignored_candidates_input.text())
 	places = places_input.value()
+	profile = profile_input.isChecked()
+	election_type = current_election_type
+
+	# All invalid ballots are reported at once, before anything is counted
+	if tally.invalid_ballots:
+		invalid_lines = tally.invalid_lines()
+		details = '\n'.join(map(lambda x: 'Linio %d: %s' % (x[0] + 1, problems_text(x[1])), invalid_lines))
+		show_count_error(InvalidBallotException('%d invalid ballots' % (len(invalid_lines))), lambda: None, details)
+		return
 
-	raw_ballots = ballots_input.toPlainText();
-	ballots = re.split(newline_regex, raw_ballots.strip())
-	ballots = map(lambda b: re.sub(space_regex, '', b), ballots)
-	ballots = filter(lambda b: len(b), ballots)
-	ballots = list(map(lambda b: '' if b == 'blanka' else b, ballots))
+	# An ignored candidate who isn't a candidate is most likely a typo
+	for cand in ignored_candidates:
+		if not cand in candidates:
+			show_count_error(InvalidIgnoredCandidateException(cand), lambda: None)
+			return
 
+	# The tally stays as it is while the ballots are hidden
+	raw_ballots = ballots_input.toPlainText();
+	tally_paused = True
 	ballots_input.setPlainText('Kaŝita')
 	def unhide_ballots ():
+		global tally_paused
 		ballots_input.setPlainText(raw_ballots)
-
-	results = None
-	try:
-		try:
-			if current_election_type == 'RP':
-				results = RankedPairs(candidates, ballots, ignored_candidates)
-			elif current_election_type == 'STV':
-				results = STV(places, candidates, ballots, ignored_candidates)
-		except TieBreakerNeededException as e:
-			tie_breaker_text  = 'La egalecrompanto mem enskribu sian balotilon ĉi-sube.'
-			if current_election_type == 'RP':
-				tie_breaker_text += '\nEkz. A>B>D>C'
-			elif current_election_type == 'STV':
-				tie_breaker_text += '\nEkz. ABDC'
-			tie_breaker_text += '\nValidaj kandidatoj:\n%s' % (', '.join(candidates))
-			tie_breaker, ok = QInputDialog.getText(window, 'Necesas egalecrompanto!', tie_breaker_text)
-
-			if not ok:
-				unhide_ballots()
-				return
-			if current_election_type == 'RP':
-				results = RankedPairs(candidates, ballots, ignored_candidates, tie_breaker)
-			elif current_election_type == 'STV':
-				results = STV(places, candidates, ballots, ignored_candidates, tie_breaker)
-	except (InvalidTieBreakerException, InvalidBallotException, TooManyBlankBallotsException) as e:
-		error_modal = QMessageBox()
-
-		if (isinstance(e, InvalidTieBreakerException)):
-			error_title = 'Nevalida egalecrompa balotilo'
-			error_text = 'La egalecrompa balotilo ne estis valida.'
-			error_modal.setIcon(QMessageBox.Warning)
-		elif isinstance(e, InvalidBallotException):
-			error_title = 'Nevalida(j) balotilo(j)'
-			error_text = 'Unu aŭ pluraj el la enmetitaj balotiloj ne estis valida(j).'
-			error_modal.setIcon(QMessageBox.Warning)
+		tally_paused = False
+		if tally_outdated:
+			rebuild_tally()
 		else:
-			error_title = 'Tro da blankaj balotiloj'
-			error_text = 'Rezulto: Sindetene (%d balotiloj el entute %d estis blankaj)' % (e.blank_ballots, e.num_ballots)
-
-		error_modal.setWindowTitle(error_title)
-		error_modal.setText(error_text)
-		error_modal.buttonClicked.connect(unhide_ballots)
-		error_modal.exec_()
+			update_tally_status()
 
-	if not results:
-		return
+	# Once the tie breaker is known the count goes on from where it stopped
+	def start_count (tie_breaker = None, checkpoint = None):
+		global count_worker
 
-	results_text = '<p>%d balotiloj kalkulitaj, %d blankaj</p>' % (results['ballots'], results['blank_ballots'])
-	if len(ignored_candidates):
-		results_text += '<p>Ignorataj kandidatoj: %s</p>' % (', '.join(ignored_candidates))
-
-	if current_election_type == 'RP':
-		if len(results['disqualified_candidates']):
-			results_text += '<p>Neelektitaj laŭ §2.6: '
-			disc_cands = list(map(lambda c: '%s (%d mencioj)' % (c, results['cand_stats'][c]['mentions']), results['disqualified_candidates']))
-			results_text += ', '.join(disc_cands)
-			results_text += '</p>'
-		
-		results_text += '<p>Komparitaj paroj: <table border="1"><tr>'
-
-		for th in ('Paro', 'Gajnanto', 'Diferenco'):
-			results_text += '<th>%s</th>' % (th)
-		results_text += '</tr>'
-
-		for pair_name, pair in results['ranked_pairs']:
-			cand1 = pair_name[0]
-			cand2 = pair_name[1]
-
-			results_text += '<tr><td>%(cand1)s (%(cand1_wins)d) kontraŭ %(cand2)s (%(cand2_wins)d)</td><td>%(winner)s</td><td>%(diff)d</td></tr>' % {
-				'cand1': cand1,
-				'cand2': cand2,
-				'cand1_wins': pair[cand1],
-				'cand2_wins': pair[cand2],
-				'winner': pair['winner'],
-				'diff': abs(pair['diff'])
-			}
-
-		results_text += '</table></p>'
-
-		results_text += '<p>Grafeo: <table border="1"><tr>'
-
-		for th in ('De', 'Al'):
-			results_text += '<th>%s</th>' % (th)
-
-		results_text += '</tr>'
-
-		for lock_from, lock_to in results['graph'].items():
-			results_text += '<tr><td>%s</td><td>%s</td></tr>' % (lock_from, ', '.join(lock_to))
-
-		results_text += '</table></p>'
-
-		results_text += '<br><p>Venkinto: %s</p>' % (results['winner'])
-
-	elif current_election_type == 'STV':
-		results_text += '<p>Elektiĝkvoto: %.3f</p>' % (results['quota'])
-
-		results_text += '<table border="1"><tr><th>Voĉdoneblo</th>'
-		for i in range(len(results['rounds'])):
-			results_text += '<th>%d-a vico</th>' % (i + 1)
-		results_text += '</tr>'
-		for cand in candidates:
-			results_text += '<tr><td>%s</td>' % (cand)
-			for i, stv_round in enumerate(results['rounds']):
-				if not cand in stv_round['votes']:
-					break
-				votes = stv_round['votes'][cand]
-				results_text += '<td>'
-				if cand in stv_round['elected']:
-					results_text += '<b>%.3f</b>' % (votes)
-				elif cand == stv_round['eliminated']:
-					results_text += '<s>%.3f</s>' % (votes)
+		result_cache = get_result_cache()
+		if checkpoint is not None:
+			count = lambda: result_cache.resume(checkpoint, tie_breaker, profile = profile)
+		else:
+			count = lambda: result_cache.count_tally(election_type, tally, ignored_candidates, places, tie_breaker, profile = profile)
+
+		progress_modal = QProgressDialog('Kalkulado …', 'Nuligi', 0, 0, window)
+		progress_modal.setWindowTitle('Kalkulado')
+		progress_modal.setWindowModality(QtCore.Qt.WindowModal)
+		progress_modal.setMinimumDuration(500)
+		progress_modal.setValue(0)
+
+		def count_done ():
+			progress_modal.hide()
+			progress_modal.deleteLater()
+			calculate_btn.setEnabled(True)
+
+		def counted (results):
+			count_done()
+			show_results(results, election_type, candidates, ignored_candidates, unhide_ballots)
+
+		def failed (e):
+			count_done()
+			if isinstance(e, TieBreakerNeededException) and tie_breaker is None:
+				tie_breaker_text  = 'La egalecrompanto mem enskribu sian balotilon ĉi-sube.'
+				if election_type == 'STV':
+					tie_breaker_text += '\nEkz. ABDC aŭ A>B>D>C'
 				else:
-					results_text += '%.3f' % (votes)
-				results_text += '</td>'
-			results_text += '</tr>'
-		results_text += '</table>'
+					tie_breaker_text += '\nEkz. A>B>D>C'
+				tie_breaker_text += '\nValidaj kandidatoj:\n%s' % (', '.join(candidates))
+				new_tie_breaker, ok = QInputDialog.getText(window, 'Necesas egalecrompanto!', tie_breaker_text)
+
+				if not ok:
+					unhide_ballots()
+					return
+				start_count(new_tie_breaker, e.checkpoint)
+			elif isinstance(e, CountCancelledException):
+				unhide_ballots()
+			elif isinstance(e, (InvalidTieBreakerException, InvalidBallotException, InvalidIgnoredCandidateException, NoEligibleCandidatesException, TooManyBlankBallotsException)):
+				show_count_error(e, unhide_ballots)
+			else:
+				# Raising from a slot would close the window along with the ballots entered, so the error is only shown
+				util.logger.error('The count failed', exc_info = e)
+				show_count_error(e, unhide_ballots, ''.join(traceback.format_exception(type(e), e, e.__traceback__)))
+
+		# The previous worker has already sent its result, but its thread may still be winding down
+		if count_worker is not None:
+			count_worker.wait()
+		count_worker = CountWorker(count)
+		count_worker.progress.connect(progress_modal.setLabelText)
+		count_worker.counted.connect(counted)
+		count_worker.failed.connect(failed)
+		progress_modal.canceled.connect(count_worker.cancel)
+		calculate_btn.setEnabled(False)
+		count_worker.start()
+
+	start_count()
+
+def show_count_error (e, unhide_ballots, details = None):
+	error_modal = QMessageBox()
+
+	if (isinstance(e, InvalidTieBreakerException)):
+		error_title = 'Nevalida egalecrompa balotilo'
+		error_text = 'La egalecrompa balotilo ne estis valida.'
+		error_modal.setIcon(QMessageBox.Warning)
+	elif isinstance(e, InvalidBallotException):
+		error_title = 'Nevalida(j) balotilo(j)'
+		error_text = 'Unu aŭ pluraj el la enmetitaj balotiloj ne estis valida(j).'
+		if details is not None:
+			error_text += '\nVidu la detalojn por ĉiuj nevalidaj linioj.'
+		error_modal.setIcon(QMessageBox.Warning)
+	elif isinstance(e, InvalidIgnoredCandidateException):
+		error_title = 'Nevalida ignorata kandidato'
+		error_text = '%s ne estas kandidato, do ne povas esti ignorata.' % (e.candidate)
+		error_modal.setIcon(QMessageBox.Warning)
+	elif isinstance(e, NoEligibleCandidatesException):
+		error_title = 'Neniu elektebla kandidato'
+		error_text = 'Ĉiuj kandidatoj estas aŭ ignorataj aŭ neelektitaj laŭ §2.6, do neniu povas venki.'
+		error_modal.setIcon(QMessageBox.Warning)
+	elif isinstance(e, TooManyBlankBallotsException):
+		error_title = 'Tro da blankaj balotiloj'
+		error_text = 'Rezulto: Sindetene (%d balotiloj el entute %d estis blankaj)' % (e.blank_ballots, e.num_ballots)
+	else:
+		error_title = 'Eraro'
+		error_text = 'La kalkulado malsukcesis:\n%s' % (e)
+		error_modal.setIcon(QMessageBox.Critical)
+
+	error_modal.setWindowTitle(error_title)
+	error_modal.setText(error_text)
+	if details is not None:
+		error_modal.setDetailedText(details)
+	error_modal.buttonClicked.connect(unhide_ballots)
+	error_modal.exec_()
+
+# Shows a table of the results to a QTableView, which only asks for the cells of the rows in sight. The last row
+# built is kept, as the view asks for each of its cells in turn
+class ResultTableModel (QtCore.QAbstractTableModel):
+	def __init__ (self, table):
+		from lib.export import cell_text
+		super().__init__()
+		self.table = table
+		self.cell_text = cell_text
+		self.last_row = (None, None)
+
+	def rowCount (self, parent = QtCore.QModelIndex()):
+		return 0 if parent.isValid() else self.table.num_rows
+
+	def columnCount (self, parent = QtCore.QModelIndex()):
+		return 0 if parent.isValid() else len(self.table.columns)
+
+	def row (self, i):
+		if self.last_row[0] != i:
+			self.last_row = (i, self.table.row(i))
+		return self.last_row[1]
+
+	def data (self, index, role = QtCore.Qt.DisplayRole):
+		if not index.isValid():
+			return None
+		if role == QtCore.Qt.DisplayRole:
+			return self.cell_text(self.row(index.row())[index.column()])
+		elif role == QtCore.Qt.TextAlignmentRole:
+			if isinstance(self.row(index.row())[index.column()], (int, float)):
+				return QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter
+		elif role == QtCore.Qt.FontRole:
+			style = self.table.cell_style(index.row(), index.column())
+			if style is not None:
+				font = QtGui.QFont()
+				font.setBold(style == 'elected')
+				font.setStrikeOut(style == 'eliminated')
+				return font
+		return None
+
+	def headerData (self, section, orientation, role = QtCore.Qt.DisplayRole):
+		if role != QtCore.Qt.DisplayRole:
+			return None
+		if orientation == QtCore.Qt.Horizontal:
+			return self.table.columns[section]
+		return section + 1
+
+export_filters = OrderedDict([ ('CSV (*.csv)', 'csv'), ('JSON (*.json)', 'json'), ('HTML (*.html)', 'html') ])
+
+def show_results (results, election_type, candidates, ignored_candidates, unhide_ballots):
+	from lib.export import result_tables, export_results
+
+	results_text = '<p>Venkintoj (laŭ ordo de elektiĝo): <b>%s</b></p>' % (', '.join(results['winners']))
+	if results.get('cache') is not None:
+		results_text += '<p><i>Rezulto el la kaŝmemoro: la samaj balotiloj jam estis kalkulitaj.</i></p>'
+
+	results_modal = QDialog(window)
+	results_modal.setWindowTitle('Rezulto trovita')
+	results_modal.resize(700, 500)
+	layout = QVBoxLayout()
+	results_modal.setLayout(layout)
+
+	results_label = QLabel(results_text)
+	results_label.setTextFormat(QtCore.Qt.RichText)
+	layout.addWidget(results_label)
+
+	# Every row is as high as the first, so that the view never has to measure the rows out of sight
+	tabs = QTabWidget()
+	layout.addWidget(tabs)
+	for table in result_tables(election_type, results, candidates, ignored_candidates):
+		view = QTableView()
+		view.setModel(ResultTableModel(table))
+		view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+		view.horizontalHeader().setResizeContentsPrecision(100)
+		view.resizeColumnsToContents()
+		tabs.addTab(view, table.title)
+
+	if 'profile' in results:
+		profile_view = QPlainTextEdit(profile_text(results['profile']))
+		profile_view.setReadOnly(True)
+		tabs.addTab(profile_view, 'Statistikoj')
+
+	def export ():
+		path, chosen_filter = QFileDialog.getSaveFileName(results_modal, 'Eksporti rezulton', '', ';;'.join(export_filters.keys()))
+		if not len(path):
+			return
+		export_format = export_filters.get(chosen_filter, 'csv')
+		if not path.lower().endswith('.' + export_format):
+			path += '.' + export_format
+		try:
+			export_results(path, election_type, results, candidates, ignored_candidates, export_format)
+		except OSError as e:
+			QMessageBox.warning(results_modal, 'Eksportado malsukcesis', 'La rezulto ne povis esti skribita al %s:\n%s' % (path, e.strerror))
 
-		results_text += '<br><p>Venkintoj (laŭ ordo de elektiĝo):<br>%s</p>' % (', '.join(results['winners']))
+	buttons = QDialogButtonBox(QDialogButtonBox.Ok)
+	export_btn = buttons.addButton('Eksporti …', QDialogButtonBox.ActionRole)
+	export_btn.clicked.connect(export)
+	buttons.accepted.connect(results_modal.accept)
+	layout.addWidget(buttons)
 
-	results_modal = QMessageBox()
-	results_modal.setWindowTitle('Rezulto trovita')
-	results_modal.setTextFormat(QtCore.Qt.RichText)
-	results_modal.setText(results_text)
-	results_modal.buttonClicked.connect(unhide_ballots)
+	results_modal.finished.connect(unhide_ballots)
 	results_modal.exec_()
 
 app = QApplication(['TEJO Voĉo'])
@@ -246,18 +478,19 @@ form_options_line2 = QVBoxLayout()
 form.addLayout(form_options_line2)
 
 # Candidates input
-candidates_label = QLabel('Voĉdonebloj: (unulitera, dividu per komo)')
+candidates_label = QLabel('Voĉdonebloj: (dividu per komo)')
 form_options_line2.addWidget(candidates_label)
 
 candidates_input = QLineEdit()
 form_options_line2.addWidget(candidates_input)
+candidates_input.textChanged.connect(lambda text: rebuild_tally())
 
 # Line 3
 form_options_line3 = QVBoxLayout()
 form.addLayout(form_options_line3)
 
 # Ignored candidates input
-ignored_candidates_label = QLabel('Ignorataj kandidatoj: (unulitera, dividu per komo)')
+ignored_candidates_label = QLabel('Ignorataj kandidatoj: (dividu per komo)')
 form_options_line3.addWidget(ignored_candidates_label)
 
 ignored_candidates_input = QLineEdit()
@@ -268,13 +501,17 @@ form_options_line4 = QVBoxLayout()
 form.addLayout(form_options_line4)
 
 # Places input
-places_label = QLabel('Kvanto de venkontoj: (nur por UTV)')
+places_label = QLabel('Kvanto de venkontoj:')
 form_options_line4.addWidget(places_label)
 
 places_input = QSpinBox()
 form_options_line4.addWidget(places_input)
 places_input.setMinimum(1)
 
+# Profile checkbox
+profile_input = QCheckBox('Montri statistikojn pri la kalkulado')
+form_options_line4.addWidget(profile_input)
+
 # Line 5
 form_options_line5 = QVBoxLayout()
 form.addLayout(form_options_line5)
@@ -286,6 +523,10 @@ form_options_line5.addWidget(ballots_label)
 ballots_input = QPlainTextEdit()
 form_options_line5.addWidget(ballots_input)
 ballots_input.setMinimumSize(400, 300)
+ballots_input.document().contentsChange.connect(ballots_changed)
+
+tally_label = QLabel()
+form_options_line5.addWidget(tally_label)
 
 change_election_type(0)
 reset_form()
@@ -293,4 +534,8 @@ reset_form()
 main_window.setWindowFlags(QtCore.Qt.Dialog | QtCore.Qt.MSWindowsFixedSizeDialogHint)
 main_window.show()
 main_window.setFixedSize(main_window.size())
+
+# Quits as soon as the window is up, which is how python -m lib.startup times the startup
+if os.environ.get('VOCHO_EXIT_AFTER_STARTUP'):
+	QtCore.QTimer.singleShot(0, app.quit)
 app.exec_()
@@ -0,0 +1,38 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.ballotfile import BallotFile, write_ballot_file
+from lib.election import count_election, count_tally, jsonable
+
+candidates = [ 'A', 'B', 'C', 'D' ]
+# Fewer distinct ballots than pairwise.numpy_min_ballots, with a pair tied both ways and some won by 3
+ballots = [ 'A>B>C>D' ] * 3 + [ 'B>A>D>C' ] * 3 + [ 'C>D>A>B' ] * 2 + [ 'A>C>B>D' ] * 3 + [ 'D>B=C>A' ]
+tie_breaker = 'A>B>C>D'
+
+def count_small_file (tmp_path, method):
+	path = str(tmp_path / 'small.vbal')
+	write_ballot_file(path, method, candidates, ballots)
+	with BallotFile(path) as ballot_file:
+		from_file = count_tally(method, ballot_file, places = 2, tie_breaker = tie_breaker)
+	from_text = count_election(method, candidates, ballots, places = 2, tie_breaker = tie_breaker)
+	return from_file, from_text
+
+def strip_cache (results):
+	return dict(filter(lambda x: x[0] != 'cache', results.items()))
+
+def test_ranked_pairs_from_small_file (tmp_path):
+	from_file, from_text = count_small_file(tmp_path, 'RP')
+	assert from_file['winners'] == from_text['winners']
+	assert from_file['ranked_pairs'] == from_text['ranked_pairs']
+	for pair_name, pair in from_file['ranked_pairs']:
+		assert type(pair['diff']) is int
+	json.dumps(jsonable(strip_cache(from_file)))
+
+def test_schulze_from_small_file (tmp_path):
+	from_file, from_text = count_small_file(tmp_path, 'SCHULZE')
+	assert from_file['winners'] == from_text['winners']
+	assert from_file['strongest_paths'] == from_text['strongest_paths']
+	json.dumps(jsonable(strip_cache(from_file)))
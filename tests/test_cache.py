@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.cache import ResultCache
+from lib.election import count_election
+from lib.exceptions import TieBreakerNeededException
+
+candidates = [ 'A', 'B', 'C' ]
+ballots = [ 'A>B>C', 'B>C>A', 'C>A>B', 'A>C>B', 'B>A>C', 'C>B>A', 'A>B>C' ]
+
+def without_cache (results):
+	return dict(filter(lambda x: x[0] != 'cache', results.items()))
+
+# Results read back from disk are just as they were counted, tuples, sets and all
+@pytest.mark.parametrize('method, tie_breaker', [ ('RP', 'A>B>C'), ('SCHULZE', 'A>B>C'), ('STV', 'ABC') ])
+def test_results_from_disk (tmp_path, method, tie_breaker):
+	counted = ResultCache(path = str(tmp_path)).count(method, candidates, ballots, places = 2, tie_breaker = tie_breaker)
+	assert counted['cache'] is None
+	read = ResultCache(path = str(tmp_path)).count(method, candidates, ballots, places = 2, tie_breaker = tie_breaker)
+	assert read['cache'] == 'disk'
+	assert without_cache(read) == without_cache(counted)
+	assert without_cache(read) == count_election(method, candidates, ballots, places = 2, tie_breaker = tie_breaker)
+	assert not len(list(filter(lambda name: not name.endswith('.json'), os.listdir(str(tmp_path)))))
+
+def test_unreadable_entries_are_counted_again (tmp_path):
+	cache = ResultCache(path = str(tmp_path))
+	cache.count('RP', candidates, ballots, tie_breaker = 'A>B>C')
+	for name in os.listdir(str(tmp_path)):
+		with open(os.path.join(str(tmp_path), name), 'w') as f:
+			f.write('{ "version": 0 }')
+	results = ResultCache(path = str(tmp_path)).count('RP', candidates, ballots, tie_breaker = 'A>B>C')
+	assert results['cache'] is None
+
+# Once a tie is broken, counting the same election without a tie breaker gives the tie-broken results
+def test_resumed_results_are_kept (tmp_path):
+	cache = ResultCache(path = str(tmp_path))
+	tied_ballots = [ 'A>B', 'B>A' ]
+	with pytest.raises(TieBreakerNeededException) as e:
+		cache.count('RP', [ 'A', 'B' ], tied_ballots)
+	resumed = cache.resume(e.value.checkpoint, 'B>A')
+	again = cache.count('RP', [ 'A', 'B' ], tied_ballots)
+	assert again['cache'] == 'memory'
+	assert again['winner'] == resumed['winner'] == 'B'
+	from_disk = ResultCache(path = str(tmp_path)).count('RP', [ 'A', 'B' ], tied_ballots)
+	assert from_disk['cache'] == 'disk'
+	assert from_disk['winner'] == 'B'
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.election import count_election
+from lib.exceptions import NoEligibleCandidatesException
+from lib.whatif import evaluate_scenarios
+
+pairwise_methods = ('RP', 'SCHULZE', 'COPELAND', 'MINIMAX')
+
+@pytest.mark.parametrize('method', pairwise_methods)
+def test_everyone_ignored (method):
+	with pytest.raises(NoEligibleCandidatesException):
+		count_election(method, [ 'A', 'B' ], [ 'A>B', 'B>A', 'A>B' ], [ 'A', 'B' ])
+
+# Each candidate is only mentioned on a third of the ballots, so all are disqualified per §2.6
+@pytest.mark.parametrize('method', pairwise_methods)
+def test_everyone_disqualified (method):
+	with pytest.raises(NoEligibleCandidatesException):
+		count_election(method, [ 'A', 'B', 'C' ], [ 'A', 'B', 'C' ], tie_breaker = 'A>B>C')
+
+@pytest.mark.parametrize('method', pairwise_methods)
+def test_everyone_ignored_scenario (method):
+	scenario = evaluate_scenarios(method, [ 'A', 'B' ], [ 'A>B', 'B>A', 'A>B' ], [ [ 'A', 'B' ] ])[0]
+	assert scenario['error'] == 'NoEligibleCandidatesException'
@@ -0,0 +1,22 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.election import count_election
+from lib.export import result_tables
+
+# Candidates named after the keys of a pair record must not overwrite them
+def test_candidates_named_after_pair_keys ():
+	candidates = [ 'winner', 'loser', 'diff' ]
+	ballots = [ 'loser>winner>diff' ] * 3 + [ 'winner>diff>loser' ] * 2
+	for method in ('RP', 'SCHULZE', 'COPELAND', 'MINIMAX'):
+		results = count_election(method, candidates, ballots, tie_breaker = 'winner>loser>diff')
+		pair = results['comp_pairs'][('loser', 'winner')]
+		assert pair['winner'] == 'loser'
+		assert pair['loser'] == 'winner'
+		assert pair['diff'] == 1
+		assert pair['votes'] == { 'loser': 3, 'winner': 2 }
+		assert results['winner'] == 'loser'
+		for table in result_tables(method, results, candidates):
+			list(table.rows())
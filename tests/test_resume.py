@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.election import count_election, resume_election
+from lib.exceptions import TieBreakerNeededException
+from lib.synthetic import generate_election
+
+# Small elections tie often enough: STV needs a handful of truncated ballots, as §3.11 settles most of its ties
+election_sizes = {
+	'STV': ('truncated', 6, 5),
+	'RP': ('impartial', 30, 4),
+	'SCHULZE': ('impartial', 30, 4),
+	'COPELAND': ('impartial', 30, 4),
+	'MINIMAX': ('impartial', 30, 4)
+}
+
+# Resuming from the checkpoint of a tie must give exactly what counting with the tie breaker from the start gives
+@pytest.mark.parametrize('method', list(election_sizes))
+def test_resume_matches_count (method):
+	model, num_ballots, num_candidates = election_sizes[method]
+	resumed = 0
+	for seed in range(60):
+		candidates, ballots = generate_election(model, num_ballots, num_candidates, seed)
+		ballots = list(ballots)
+		try:
+			count_election(method, candidates, ballots, places = 2)
+			continue
+		except TieBreakerNeededException:
+			pass
+		for tie_breaker in ('>'.join(candidates), '>'.join(reversed(candidates))):
+			# Each tie breaker needs a checkpoint of its own, as the count carries on in the checkpoint
+			checkpoint = pytest.raises(TieBreakerNeededException, count_election, method, candidates, ballots, places = 2).value.checkpoint
+			results = resume_election(checkpoint, tie_breaker)
+			assert results == count_election(method, candidates, ballots, places = 2, tie_breaker = tie_breaker), seed
+		resumed += 1
+	assert resumed >= 2
+
+# A checkpoint goes on from where it stopped, so it can only be resumed once
+def test_checkpoint_resumed_once ():
+	with pytest.raises(TieBreakerNeededException) as e:
+		count_election('RP', [ 'A', 'B' ], [ 'A>B', 'B>A' ])
+	resume_election(e.value.checkpoint, 'A>B')
+	with pytest.raises(ValueError):
+		resume_election(e.value.checkpoint, 'A>B')
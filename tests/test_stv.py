@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.exceptions import TieBreakerNeededException, TooManyBlankBallotsException
+from lib.stv import STV
+from lib.synthetic import generate_election
+
+stv_models = ('impartial', 'mallows', 'polarized', 'truncated', 'blanks')
+
+def synthetic_elections (num_ballots, num_candidates, seeds):
+	for model in stv_models:
+		for seed in seeds:
+			candidates, ballots = generate_election(model, num_ballots, num_candidates, seed)
+			yield model, seed, candidates, list(ballots)
+
+def count_or_error (*args, **kwargs):
+	try:
+		return STV(*args, **kwargs)
+	except (TieBreakerNeededException, TooManyBlankBallotsException) as e:
+		return type(e).__name__
+
+# The pile engine must give exactly the results of the scan engine, floats and all
+@pytest.mark.parametrize('ignored', [ 0, 2 ])
+def test_engines_agree (ignored):
+	for model, seed, candidates, ballots in synthetic_elections(300, 7, range(8)):
+		ignored_candidates = candidates[:ignored]
+		tie_breaker = '>'.join(candidates)
+		piles = count_or_error(3, candidates, ballots, ignored_candidates, tie_breaker, engine = 'piles')
+		scan = count_or_error(3, candidates, ballots, ignored_candidates, tie_breaker, engine = 'scan')
+		assert piles == scan, (model, seed)
+
+# §3.11: of the candidates with the least votes, the one with the least first, then second etc. preferences on the
+# original ballots is eliminated
+def test_tie_resolved_by_positions ():
+	candidates = [ 'A', 'B', 'C', 'D' ]
+	# B and C both have 2 first preferences, but B has 3 second preferences
+	results = STV(1, candidates, [ 'AB' ] * 3 + [ 'BA' ] * 2 + [ 'CA' ] * 2 + [ 'DA' ] * 4)
+	assert results['rounds'][0]['eliminated'] == 'C'
+	# B and C are equal in the first and second positions, but B has 3 third preferences
+	results = STV(1, candidates, [ 'ADB' ] * 3 + [ 'BA' ] * 2 + [ 'CA' ] * 2 + [ 'DA' ] * 4)
+	assert results['rounds'][0]['eliminated'] == 'C'
+
+# Candidates equal in every position are separated by the tie breaker, whose least preferred of them is eliminated
+def test_tie_resolved_by_tie_breaker ():
+	candidates = [ 'A', 'B', 'C', 'D' ]
+	ballots = [ 'AD' ] * 3 + [ 'BA' ] * 2 + [ 'CA' ] * 2 + [ 'DA' ] * 4
+	with pytest.raises(TieBreakerNeededException):
+		STV(1, candidates, ballots)
+	assert STV(1, candidates, ballots, tie_breaker = 'ABCD')['rounds'][0]['eliminated'] == 'C'
+	assert STV(1, candidates, ballots, tie_breaker = 'ACBD')['rounds'][0]['eliminated'] == 'B'
+
+# Whether any candidate's votes come within margin of the quota or of another candidate's votes in any round, where
+# rounding may decide differently between floats and fixed point
+def knife_edge (results, margin = 1e-3):
+	for stv_round in results['rounds']:
+		votes = sorted(stv_round['votes'].values())
+		if any(map(lambda v: abs(v - results['quota']) < margin, votes)):
+			return True
+		if any(map(lambda x: 0 < x[1] - x[0] < margin, zip(votes, votes[1:]))):
+			return True
+	return False
+
+# Away from the knife-edge fixed point elects and eliminates the same candidates as floats, with the same votes
+# up to the rounding of its decimals
+def test_fixed_point_matches_floats ():
+	compared = 0
+	for model, seed, candidates, ballots in synthetic_elections(200, 6, range(10)):
+		tie_breaker = '>'.join(candidates)
+		floats = count_or_error(3, candidates, ballots, tie_breaker = tie_breaker)
+		fixed = count_or_error(3, candidates, ballots, tie_breaker = tie_breaker, decimals = 6)
+		if isinstance(floats, str) or isinstance(fixed, str):
+			assert floats == fixed, (model, seed)
+			continue
+		if knife_edge(floats) or knife_edge(fixed):
+			continue
+		compared += 1
+		assert fixed['winners'] == floats['winners'], (model, seed)
+		assert fixed['quota'] == pytest.approx(floats['quota'], abs = 1e-6)
+		assert len(fixed['rounds']) == len(floats['rounds'])
+		for fixed_round, float_round in zip(fixed['rounds'], floats['rounds']):
+			assert fixed_round['elected'] == float_round['elected']
+			assert fixed_round['eliminated'] == float_round['eliminated']
+			for cand, votes in float_round['votes'].items():
+				assert fixed_round['votes'][cand] == pytest.approx(votes, abs = 1e-4)
+	assert compared >= 40
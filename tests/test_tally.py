@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.tally import LiveTally
+
+candidates = [ 'A', 'B', 'C', 'D' ]
+# Valid, blank, empty and invalid lines alike
+line_pool = {
+	'STV': [ 'ABC', 'BCA', 'C', 'DAB', 'A>B>D', 'blanka', '', ' ', 'AAB', 'AXB', 'A=B' ],
+	'RP': [ 'A>B>C', 'B=C>A', 'C', 'D>A>B', 'A>B=C=D', 'blanka', '', ' ', 'A>A', 'A>X', 'A>>B' ]
+}
+
+def tally_state (tally):
+	state = {
+		'lines': tally.lines,
+		'counts': tally.counts,
+		'num_ballots': tally.num_ballots,
+		'blank_ballots': tally.blank_ballots,
+		'invalid_ballots': tally.invalid_ballots,
+		'invalid_lines': tally.invalid_lines()
+	}
+	if tally.method == 'STV':
+		state['first_preferences'] = tally.first_preferences
+		state['ballot_groups'] = tally.ballot_groups()
+	else:
+		state['matrix'] = tally.matrix
+		state['mentions'] = tally.mentions
+	return state
+
+# However the lines are edited, the tally must end up as if the ballots were tallied anew
+@pytest.mark.parametrize('method', [ 'STV', 'RP' ])
+def test_edits_match_fresh_tally (method):
+	rng = random.Random(0)
+	lines = []
+	tally = LiveTally(method, candidates)
+	for edit in range(500):
+		start = rng.randint(0, len(lines))
+		end = rng.randint(start, min(len(lines), start + 5))
+		new_lines = list(map(lambda i: rng.choice(line_pool[method]), range(rng.randint(0, 5))))
+		lines[start:end] = new_lines
+		tally.replace_lines(start, end, new_lines)
+		if not edit % 25:
+			assert tally_state(tally) == tally_state(LiveTally(method, candidates, lines))
+	assert tally_state(tally) == tally_state(LiveTally(method, candidates, lines))
+
+# Many distinct ballots at once take the NumPy path of the pairwise matrix, which must add up the same
+def test_large_edit_matches_fresh_tally ():
+	rng = random.Random(1)
+	ballots = list(map(lambda i: '>'.join(rng.sample(candidates, rng.randint(1, 4))), range(300)))
+	tally = LiveTally('RP', candidates, ballots[:100])
+	tally.replace_lines(50, 100, ballots[100:])
+	assert tally_state(tally) == tally_state(LiveTally('RP', candidates, ballots[:50] + ballots[100:]))
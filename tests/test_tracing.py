@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib import util
+from lib.election import count_election
+from lib.exceptions import CountCancelledException
+from lib.synthetic import generate_election
+
+# A sink that cancels the count at the first tallying event, as the GUI does once Cancel is pressed
+def cancel_at_tallying (event):
+	if event['event'] == 'tallying':
+		raise CountCancelledException()
+
+# The tally is the longest part of a large count, so it must be possible to cancel it
+@pytest.mark.parametrize('method, num_ballots', [ ('RP', 50), ('RP', 5000), ('SCHULZE', 5000), ('STV', 5000) ])
+def test_tally_can_be_cancelled (method, num_ballots):
+	candidates, ballots = generate_election('impartial', num_ballots, 6, 0)
+	util.add_trace_sink(cancel_at_tallying)
+	try:
+		with pytest.raises(CountCancelledException):
+			count_election(method, candidates, list(ballots), tie_breaker = '>'.join(candidates))
+	finally:
+		util.remove_trace_sink(cancel_at_tallying)
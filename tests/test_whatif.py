@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.election import count_election
+from lib.whatif import evaluate_scenarios, single_withdrawals
+
+candidates = [ 'A', 'B', 'C' ]
+lines = [ 'ABC', 'BCA', 'CAB', 'ABC', 'BAC' ]
+
+# With as many places as candidates, every candidate left once the ignored ones are gone is elected
+def test_stv_scenarios_at_full_places ():
+	scenarios = evaluate_scenarios('STV', candidates, lines, single_withdrawals(candidates), places = 3)
+	for scenario in scenarios:
+		assert not 'error' in scenario
+		assert sorted(scenario['results']['winners']) == sorted(set(candidates) - set(scenario['ignored']))
+
+def test_stv_scenario_matches_count ():
+	scenario = evaluate_scenarios('STV', candidates, lines, [ [ 'B' ] ], places = 3)[0]
+	results = count_election('STV', candidates, lines, [ 'B' ], places = 3)
+	assert scenario['results']['winners'] == results['winners']
+	assert scenario['results']['quota'] == results['quota']